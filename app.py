@@ -1,26 +1,215 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.datastructures import MultiDict
+import abc
+import asyncio
+import atexit
+import base64
+import click
+import codecs
+import csv
+import contextvars
+import itertools
 import json
+import os
+import pickle
+import queue
 import gzip
+import hashlib
+import heapq
 import html
-import io
-import urllib.error
-import urllib.request
-from urllib.parse import urlencode, unquote
+from urllib.parse import quote, urlencode, unquote, urlparse
 import re
+import sys
 import time
+import zlib
 import requests
-import socket
+from requests.adapters import HTTPAdapter
+import urllib3
+try:
+    import aiohttp
+except ImportError:  # Native async engines fall back to the pooled sync transport
+    aiohttp = None
+try:
+    import orjson
+except ImportError:  # JSON is read and written with the stdlib json module
+    orjson = None
+try:
+    import brotli
+except ImportError:  # Responses are only gzip-compressed
+    brotli = None
+import sqlite3
+import math
+import threading
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
 import logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 CORS(app)
 
+# Fan-out settings for multi-site searches (seconds)
+SEARCH_DEADLINE = float(os.environ.get('SEARCH_DEADLINE', '30'))
+ENGINE_DEADLINE = float(os.environ.get('ENGINE_DEADLINE', '20'))
+FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS', '72'))
+LOOKUP_WORKERS = int(os.environ.get('LOOKUP_WORKERS', '8'))
+
+# Shared pool for sync engine searches. Only PirateBay and Torrents-CSV run
+# on the engine loop; each of the eight sync engines holds one worker for its
+# whole search, so a site=all search takes eight and the pool caps concurrent
+# uncached site=all searches at FANOUT_WORKERS // 8. The default covers the 8
+# gunicorn request threads, plus one search's worth for engines that overrun
+# their deadline and keep their worker until their own requests time out.
+fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='engine')
+# Pool for the short blocking lookups around a search (local index, shared
+# state), and the engine loop's default executor. Kept apart from the engine
+# pool so a slow fan-out cannot starve them.
+lookup_executor = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix='lookup')
+
+# Detail-page resolution settings (budget in seconds per search)
+DETAIL_BUDGET = float(os.environ.get('DETAIL_BUDGET', '12'))
+DETAIL_WORKERS = int(os.environ.get('DETAIL_WORKERS', '32'))
+DETAIL_PER_HOST = int(os.environ.get('DETAIL_PER_HOST', '6'))
+
+# Upstream HTTP transport: number of per-host pools kept and connections per pool
+POOL_CONNECTIONS = int(os.environ.get('POOL_CONNECTIONS', '16'))
+POOL_MAXSIZE = int(os.environ.get('POOL_MAXSIZE', '16'))
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', '500'))
+# Engine health: request outcomes kept per engine, how many are needed before
+# the circuit may open, the failure rate that opens it, and the cooldown before
+# a half-open probe (doubled after each failed probe, up to the max)
+HEALTH_WINDOW = int(os.environ.get('HEALTH_WINDOW', '50'))
+HEALTH_MIN_REQUESTS = int(os.environ.get('HEALTH_MIN_REQUESTS', '3'))
+HEALTH_FAILURE_RATE = float(os.environ.get('HEALTH_FAILURE_RATE', '0.5'))
+HEALTH_COOLDOWN = float(os.environ.get('HEALTH_COOLDOWN', '30'))
+HEALTH_MAX_COOLDOWN = float(os.environ.get('HEALTH_MAX_COOLDOWN', '600'))
+
+# Upstream request timeout (seconds): TIMEOUT_P95_FACTOR times the p95 latency
+# of an engine's recent successful requests, kept between the min and the max
+UPSTREAM_TIMEOUT = float(os.environ.get('UPSTREAM_TIMEOUT', '10'))
+UPSTREAM_TIMEOUT_MIN = float(os.environ.get('UPSTREAM_TIMEOUT_MIN', '2'))
+TIMEOUT_P95_FACTOR = float(os.environ.get('TIMEOUT_P95_FACTOR', '2'))
+
+# Upstream request scheduling: requests per second and burst allowed per host
+# (a rate of 0 disables the limit), overrides as "host=rate[:burst],..." with
+# hosts as they appear in URLs, and the longest a request waits for its turn
+HOST_RATE = float(os.environ.get('HOST_RATE', '10'))
+HOST_BURST = float(os.environ.get('HOST_BURST', '20'))
+HOST_RATES = os.environ.get('HOST_RATES', '')
+SCHEDULER_MAX_WAIT = float(os.environ.get('SCHEDULER_MAX_WAIT', '15'))
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/94.0.4606.81 Safari/537.36'
+
+# Local state (caches, indexes) lives under DATA_DIR
+DATA_DIR = os.environ.get('DATA_DIR', 'data')
+INFOHASH_CACHE_PATH = os.environ.get('INFOHASH_CACHE_PATH', os.path.join(DATA_DIR, 'infohash_cache.db'))
+INFOHASH_CACHE_SIZE = int(os.environ.get('INFOHASH_CACHE_SIZE', '200000'))
+
+# Result cache entries and open circuits shared by the worker processes of one
+# server (off unless SHARED_STATE=1), and how often a worker rereads circuits
+SHARED_STATE = os.environ.get('SHARED_STATE', '0') == '1'
+SHARED_STATE_PATH = os.environ.get('SHARED_STATE_PATH', os.path.join(DATA_DIR, 'shared_state.db'))
+SHARED_STATE_SYNC = float(os.environ.get('SHARED_STATE_SYNC', '1'))
+
+# Local search index of every torrent seen: path and row bound, how often the
+# bound is enforced (seconds), pending write batches before results are
+# dropped, half-life of an indexed seed count (seconds), matches ranked per
+# query, matches past which a query is ranked by seeders alone and results
+# returned when the query gives no limit
+SEARCH_INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH', os.path.join(DATA_DIR, 'search_index.db'))
+SEARCH_INDEX_SIZE = int(os.environ.get('SEARCH_INDEX_SIZE', '1000000'))
+SEARCH_INDEX_PRUNE_INTERVAL = float(os.environ.get('SEARCH_INDEX_PRUNE_INTERVAL', '300'))
+SEARCH_INDEX_QUEUE = int(os.environ.get('SEARCH_INDEX_QUEUE', '1000'))
+SEARCH_INDEX_HALF_LIFE = float(os.environ.get('SEARCH_INDEX_HALF_LIFE', '604800'))
+SEARCH_INDEX_CANDIDATES = int(os.environ.get('SEARCH_INDEX_CANDIDATES', '1000'))
+SEARCH_INDEX_BROAD = int(os.environ.get('SEARCH_INDEX_BROAD', '2000'))
+LOCAL_SEARCH_LIMIT = int(os.environ.get('LOCAL_SEARCH_LIMIT', '100'))
+SEARCH_MODES = ('live', 'local', 'hybrid')
+# Index of the Torrents-CSV dump (flask import-torrents-csv) and where the
+# Torrents CSV engine searches: 'live' asks torrents-csv.com, 'local' only the
+# dump index and 'auto' the dump index once one has been imported
+TORRENTS_CSV_INDEX_PATH = os.environ.get('TORRENTS_CSV_INDEX_PATH', os.path.join(DATA_DIR, 'torrentscsv.db'))
+TORRENTS_CSV_MODE = os.environ.get('TORRENTS_CSV_MODE', 'auto')
+# Orders /api/search can sort by, and directions
+SEARCH_SORTS = ('seeds', 'size', 'date', 'ratio')
+SEARCH_ORDERS = ('desc', 'asc')
+# Fewest results per engine a seeder-ordered /api/search page asks for;
+# larger pages ask for the next power of two past their end, so nearby pages
+# share one cached response while engines can still stop paging early
+SEARCH_DEPTH = int(os.environ.get('SEARCH_DEPTH', '16'))
+# Most searches one POST /api/search/batch may carry
+BATCH_MAX_SEARCHES = int(os.environ.get('BATCH_MAX_SEARCHES', '50'))
+
+# Prefetching of popular searches: every PREFETCH_INTERVAL seconds, up to
+# PREFETCH_BUDGET of the PREFETCH_TOP_K most requested searches whose cached
+# response would expire before the next round are re-run, PREFETCH_CONCURRENCY
+# at a time. Popularity halves every PREFETCH_HALF_LIFE seconds and at most
+# PREFETCH_TRACKED searches are counted. Searches whose decayed count is below
+# PREFETCH_MIN_WEIGHT are never prefetched. A budget of 0 disables prefetching.
+PREFETCH_INTERVAL = float(os.environ.get('PREFETCH_INTERVAL', '60'))
+PREFETCH_TOP_K = int(os.environ.get('PREFETCH_TOP_K', '200'))
+PREFETCH_BUDGET = int(os.environ.get('PREFETCH_BUDGET', '50'))
+PREFETCH_CONCURRENCY = int(os.environ.get('PREFETCH_CONCURRENCY', '2'))
+PREFETCH_HALF_LIFE = float(os.environ.get('PREFETCH_HALF_LIFE', '3600'))
+PREFETCH_TRACKED = int(os.environ.get('PREFETCH_TRACKED', '10000'))
+PREFETCH_MIN_WEIGHT = float(os.environ.get('PREFETCH_MIN_WEIGHT', '2'))
+
+# Search result cache: entry bound, default TTL, how long past the TTL a stale
+# entry may still be served while it is refreshed, and TTL for partial results
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', '2000'))
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', '300'))
+RESULT_CACHE_STALE = float(os.environ.get('RESULT_CACHE_STALE', '1800'))
+PARTIAL_RESULT_TTL = float(os.environ.get('PARTIAL_RESULT_TTL', '30'))
+# Negative caching: how long an engine search that found nothing is cached,
+# and how long a failed engine search keeps failing without a new attempt
+NEGATIVE_RESULT_TTL = float(os.environ.get('NEGATIVE_RESULT_TTL', '60'))
+ENGINE_ERROR_TTL = float(os.environ.get('ENGINE_ERROR_TTL', '30'))
+
+# Engine relevance for site=all searches: engines that do not cover the
+# requested category are skipped, and so are engines whose last
+# RELEVANCE_WINDOW upstream searches in the category found something less
+# than RELEVANCE_MIN_HIT_RATE of the time (judged after RELEVANCE_MIN_SEARCHES).
+# Every RELEVANCE_PROBE_EVERY-th skip of such an engine searches it in the
+# background instead, so it can win its place back. A rate of 0 disables the
+# learned skipping.
+RELEVANCE_WINDOW = int(os.environ.get('RELEVANCE_WINDOW', '50'))
+RELEVANCE_MIN_SEARCHES = int(os.environ.get('RELEVANCE_MIN_SEARCHES', '10'))
+RELEVANCE_MIN_HIT_RATE = float(os.environ.get('RELEVANCE_MIN_HIT_RATE', '0.05'))
+RELEVANCE_PROBE_EVERY = int(os.environ.get('RELEVANCE_PROBE_EVERY', '10'))
+
+# Upstream bodies are read in chunks of this many bytes and cut off past
+# MAX_BODY_SIZE decoded bytes
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', '65536'))
+MAX_BODY_SIZE = int(os.environ.get('MAX_BODY_SIZE', str(8 * 1024 * 1024)))
+
+def brotli_bounded():
+    """Whether the installed brotli can cap how much one call decompresses (1.2+)"""
+    try:
+        return brotli is not None and brotli.Decompressor().process(b'', output_buffer_limit=1) == b''
+    except TypeError:
+        return False
+
+# Content codings asked of upstream sites: only those Inflater can decode
+# without exceeding MAX_BODY_SIZE
+ACCEPT_ENCODING = 'gzip, deflate, br' if brotli_bounded() else 'gzip, deflate'
+
+# Seconds clients may reuse /api/sites and /api/categories before revalidating
+LISTING_MAX_AGE = int(os.environ.get('LISTING_MAX_AGE', '300'))
+
+# Response compression: smallest body worth compressing, gzip level and brotli
+# quality (both kept low, responses are compressed per request)
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '5'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
 # Common trackers list for magnet links
 trackers_list = [
     'udp://tracker.internetwarriors.net:1337/announce',
@@ -34,60 +223,1207 @@ trackers_list = [
     'udp://exodus.desync.com:6969/announce',
     'udp://tracker.tiny-vps.com:6969/announce'
 ]
+# The tr= part of every magnet link built here, encoded once
+TRACKERS_QUERY = '&'.join(urlencode({'tr': tracker}) for tracker in trackers_list)
 
-# Base Torrent API class
-class BaseTorrentAPI:
-    def retrieve_url(self, url, request_data=None, timeout=10):
-        """Request data from API with improved error handling and timeouts"""
+# Histogram buckets for /metrics: upstream and search latency in seconds,
+# page parse time in seconds, and result counts per engine search
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+PARSE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+RESULT_COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500)
+QUEUE_WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15)
+
+class Metrics:
+    """In-process counters and histograms rendered in the Prometheus text format.
+
+    Each family is declared once with its help text and label names, then
+    updated with label values in declaration order. A family may instead be
+    given a collect callable returning {label values: value}, read at render
+    time, for numbers that are already counted elsewhere.
+    """
+    def __init__(self, prefix='torrent_search'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.families = {}
+
+    def declare(self, kind, name, help, labels=(), buckets=None, collect=None):
+        self.families[name] = {"kind": kind, "help": help, "labels": labels,
+                               "buckets": buckets, "collect": collect, "series": {}}
+
+    def counter(self, name, help, labels=(), collect=None):
+        self.declare('counter', name, help, labels, collect=collect)
+
+    def gauge(self, name, help, labels=(), collect=None):
+        self.declare('gauge', name, help, labels, collect=collect)
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.declare('histogram', name, help, labels, buckets=buckets)
+
+    def inc(self, name, *labels, amount=1):
+        series = self.families[name]["series"]
+        with self.lock:
+            series[labels] = series.get(labels, 0) + amount
+
+    def observe(self, name, value, *labels):
+        family = self.families[name]
+        with self.lock:
+            # Per-bucket counts (the last one is +Inf), then the sum
+            counts = family["series"].get(labels)
+            if counts is None:
+                counts = family["series"][labels] = [0] * (len(family["buckets"]) + 1) + [0.0]
+            counts[bisect_left(family["buckets"], value)] += 1
+            counts[-1] += value
+
+    def timer(self, name, *labels):
+        """Context manager observing the duration of its block"""
+        return MetricTimer(self, name, labels)
+
+    def render(self):
+        lines = []
+        for name, family in self.families.items():
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {family['help']}")
+            lines.append(f"# TYPE {full_name} {family['kind']}")
+            if family["collect"]:
+                series = family["collect"]()
+            else:
+                with self.lock:
+                    series = {labels: list(value) if isinstance(value, list) else value
+                              for labels, value in family["series"].items()}
+            for labels, value in sorted(series.items()):
+                pairs = list(zip(family["labels"], labels))
+                if family["kind"] != 'histogram':
+                    lines.append(f"{full_name}{format_labels(pairs)} {format_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(family["buckets"] + ('+Inf',), value[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else format_number(bound)
+                    lines.append(f"{full_name}_bucket{format_labels(pairs + [('le', le)])} {cumulative}")
+                lines.append(f"{full_name}_sum{format_labels(pairs)} {format_number(value[-1])}")
+                lines.append(f"{full_name}_count{format_labels(pairs)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+class MetricTimer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, *self.labels)
+
+def format_labels(pairs):
+    """Render (label, value) pairs as {label="value",...}"""
+    if not pairs:
+        return ''
+    rendered = []
+    for label, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        rendered.append(f'{label}="{value}"')
+    return '{' + ','.join(rendered) + '}'
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+metrics = Metrics()
+metrics.histogram('upstream_request_duration_seconds', 'Time to fetch one upstream URL', ('engine',))
+metrics.counter('upstream_requests_total', 'Upstream requests by outcome', ('engine', 'outcome'))
+metrics.counter('upstream_response_bytes_total', 'Decoded response body bytes received from upstream', ('engine',))
+metrics.histogram('parse_duration_seconds', 'Time spent parsing one upstream page', ('engine',), PARSE_BUCKETS)
+metrics.histogram('engine_search_duration_seconds', 'Duration of uncached engine searches', ('engine',))
+metrics.histogram('engine_results', 'Results returned by one uncached engine search', ('engine',),
+                  RESULT_COUNT_BUCKETS)
+metrics.counter('engine_searches_total', 'Engine searches answered in fan-out by status', ('engine', 'status'))
+metrics.counter('prefetch_searches_total', 'Background searches run to keep popular queries cached', ('status',))
+
+class HTTPTransport:
+    """Shared keep-alive HTTP client for every engine.
+
+    One requests session holds a connection pool per host, so the page and
+    detail requests a search makes to the same site reuse their TCP/TLS
+    connections. Accept-Encoding advertises gzip and deflate, plus br when
+    the installed brotli can decode with bounded output. With stream=True the
+    body is left unread, to be consumed in raw, still encoded chunks with
+    raw.stream(decode_content=False) and decoded by PageDecoder.
+    """
+    def __init__(self, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept-Encoding': ACCEPT_ENCODING
+        })
+
+    def request(self, url, request_data=None, timeout=10, stream=False):
+        if request_data:
+            return self.session.post(url, data=request_data, timeout=timeout, stream=stream,
+                                     headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        return self.session.get(url, timeout=timeout, stream=stream)
+
+transport = HTTPTransport()
+
+class BodyTooLarge(Exception):
+    """An upstream response body is larger than MAX_BODY_SIZE"""
+
+class FetchError(Exception):
+    """An engine search found nothing because its upstream requests failed"""
+
+class Inflater:
+    """Incremental gzip, deflate or brotli decoder that gives up past max_size bytes.
+
+    Each call inflates at most one byte more than is left of max_size, so a
+    small compressed body cannot expand into a large allocation before
+    BodyTooLarge is raised.
+    """
+    def __init__(self, encoding, max_size=MAX_BODY_SIZE):
+        self.encoding = encoding
+        self.max_size = max_size
+        self.size = 0
+        self.started = False
+        if encoding == 'br':
+            self.brotli = brotli.Decompressor()
+        elif encoding in ('gzip', 'x-gzip'):
+            self.zlib = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            self.zlib = zlib.decompressobj()
+        else:
+            raise ValueError(f"unsupported Content-Encoding {encoding}")
+
+    def decompress(self, data):
+        inflated = []
+        if self.encoding == 'br':
+            # Once the output limit is hit the decompressor must be drained
+            # with empty input before it takes more
+            while True:
+                chunk = self.brotli.process(data, output_buffer_limit=self.left())
+                self.count(chunk, inflated)
+                data = b''
+                if self.brotli.can_accept_more_data():
+                    break
+            return b''.join(inflated)
+        while data:
+            try:
+                chunk = self.zlib.decompress(data, self.left())
+            except zlib.error:
+                # Some servers send deflate as a raw stream without the zlib header
+                if self.encoding != 'deflate' or self.started:
+                    raise
+                self.zlib = zlib.decompressobj(-zlib.MAX_WBITS)
+                chunk = self.zlib.decompress(data, self.left())
+            self.started = True
+            self.count(chunk, inflated)
+            data = self.zlib.unconsumed_tail
+        return b''.join(inflated)
+
+    def flush(self):
+        if self.encoding == 'br':
+            return b''
+        inflated = []
+        self.count(self.zlib.flush(self.left()), inflated)
+        return b''.join(inflated)
+
+    def left(self):
+        return self.max_size - self.size + 1
+
+    def count(self, chunk, inflated):
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise BodyTooLarge(f"body inflates to over {self.max_size} bytes")
+        inflated.append(chunk)
+
+class PageDecoder:
+    """Turn a response body into the unescaped text the parsers expect, chunk by chunk.
+
+    Raw bytes are fed in as they arrive and text comes out: the declared
+    Content-Encoding is undone, a gzip body a site sent without saying so is
+    inflated, the charset is decoded, &quot; is escaped and HTML entities are
+    unescaped, without the body ever being held whole. Text from a trailing
+    '&' that may start an entity is held back until the next chunk completes
+    it. Raises BodyTooLarge as soon as the declared Content-Length or the
+    bytes out of any decoding step pass max_size; inflating happens in
+    bounded steps (see Inflater), so this holds for compression bombs too.
+    """
+    # Longer than any HTML entity, so text before the last '&' this far from
+    # the end of a chunk can be unescaped on its own
+    ENTITY_HOLDBACK = 40
+
+    def __init__(self, content_type='', content_length=None, max_size=MAX_BODY_SIZE, content_encoding=''):
+        self.max_size = max_size
+        if content_length and content_length.isdigit() and int(content_length) > max_size:
+            raise BodyTooLarge(f"Content-Length {content_length} is over {max_size} bytes")
+        charset = 'utf-8'
+        if 'charset=' in content_type:
+            charset = content_type.split('charset=', 1)[1].strip().strip('"')
+        try:
+            self.decoder = codecs.getincrementaldecoder(charset)('replace')
+        except LookupError:
+            self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        # Codings are listed in the order they were applied, so undone in reverse
+        encodings = [encoding.strip().lower() for encoding in (content_encoding or '').split(',')]
+        self.inflaters = [Inflater(encoding, max_size) for encoding in reversed(encodings)
+                          if encoding and encoding != 'identity']
+        self.head = b''  # first decoded bytes, until there are enough to spot gzip
+        self.inflater = None  # for a gzip body sent without saying so
+        self.received = 0
+        self.size = 0
+        self.pending = ''
+
+    @classmethod
+    def for_response(cls, headers, max_size=MAX_BODY_SIZE):
+        """A decoder for a response with these headers"""
+        return cls(headers.get('Content-Type', ''), headers.get('Content-Length'), max_size,
+                   headers.get('Content-Encoding', ''))
+
+    def feed(self, data):
+        """Decode the next raw chunk of the body, returning the text complete so far"""
+        self.received += len(data)
+        for inflater in self.inflaters:
+            data = inflater.decompress(data)
+        if self.head is not None:
+            self.head += data
+            if len(self.head) < 2:
+                return ''
+            data = self.sniff()
+        return self.unescape(self.decoder.decode(self.inflate(data)))
+
+    def close(self):
+        """Return whatever text is left once the whole body has been fed"""
+        data = b''
+        for inflater in self.inflaters:
+            data = inflater.decompress(data) + inflater.flush()
+        if self.head is not None:
+            self.head += data
+            data = self.sniff()
+        tail = self.inflate(data) + (self.inflater.flush() if self.inflater is not None else b'')
+        return self.unescape(self.decoder.decode(tail, True), final=True)
+
+    def sniff(self):
+        data, self.head = self.head, None
+        # Some sites send gzip bodies without saying so
+        if data[:2] == b'\x1f\x8b':
+            self.inflater = Inflater('gzip', self.max_size)
+        return data
+
+    def inflate(self, data):
+        if self.inflater is not None:
+            data = self.inflater.decompress(data)
+        self.count(len(data))
+        return data
+
+    def count(self, size):
+        self.size += size
+        if self.size > self.max_size:
+            raise BodyTooLarge(f"body is over {self.max_size} bytes")
+
+    def unescape(self, text, final=False):
+        text = self.pending + text
+        cut = -1 if final else text.find('&', max(0, len(text) - self.ENTITY_HOLDBACK))
+        if cut == -1:
+            cut = len(text)
+        self.pending = text[cut:]
+        return html.unescape(text[:cut].replace('&quot;', '\\"'))
+
+# Upstream request priorities, most urgent first: search listing pages, then
+# detail pages. Requests made for a background prefetch rank after both.
+PRIORITY_PAGE = 0
+PRIORITY_DETAIL = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = ('page', 'detail', 'background_page', 'background_detail')
+
+# The fan-out a request is made for, so the scheduler can share a host fairly
+# between concurrent searches, and whether it is a background prefetch
+search_flow = contextvars.ContextVar('search_flow', default=None)
+background_fetch = contextvars.ContextVar('background_fetch', default=False)
+search_flows = itertools.count(1)
+# Outcomes of the upstream requests that failed during the engine search
+# being run, or None outside one; see cached_engine_search
+fetch_failures = contextvars.ContextVar('fetch_failures', default=None)
+
+def note_fetch_failure(outcome):
+    failures = fetch_failures.get()
+    if failures is not None:
+        failures.append(outcome)
+
+def parse_host_rates(spec):
+    """Parse a HOST_RATES value into {host: (rate, burst)}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        host, _, value = item.partition('=')
+        rate, _, burst = value.partition(':')
+        rates[host.strip()] = (float(rate), float(burst) if burst else HOST_BURST)
+    return rates
+
+class HostBucket:
+    """Token bucket and wait queue of one upstream host"""
+    __slots__ = ('rate', 'burst', 'tokens', 'updated', 'queue', 'turns')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.queue = []  # heap of (priority, turn, sequence, ticket)
+        self.turns = {}  # flow -> requests it has queued since the queue was last empty
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+class SchedulerTicket:
+    """A queued request: a thread blocked on event, or a future on an event loop"""
+    __slots__ = ('event', 'loop', 'future', 'granted', 'cancelled')
+
+    def __init__(self, event=None, loop=None, future=None):
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.granted = False
+        self.cancelled = False
+
+    def grant(self):
+        # Called with the scheduler lock held
+        self.granted = True
+        if self.future is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.resolve)
+
+    def resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+class RequestScheduler:
+    """Per-host token buckets that every upstream request waits on.
+
+    Each host's bucket refills at its rate up to its burst, so a burst of
+    searches cannot flood one site. A request that finds the bucket empty, or
+    others already waiting, is queued by priority (listing pages before detail
+    pages, prefetches last) and, within a priority, takes turns with the other
+    searches waiting on that host, so one search with many detail pages
+    cannot starve the rest. A dispatcher thread hands out tokens as they
+    refill, waking blocked threads or resolving futures on their event loop.
+    """
+    def __init__(self, rate=HOST_RATE, burst=HOST_BURST, overrides=HOST_RATES):
+        self.rate = rate
+        self.burst = burst
+        self.overrides = parse_host_rates(overrides)
+        self.buckets = {}
+        self.cond = threading.Condition()
+        self.sequence = itertools.count()
+        self.dispatcher = None
+
+    def bucket(self, host):
+        # Called with the lock held
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            rate, burst = self.overrides.get(host, (self.rate, self.burst))
+            bucket = self.buckets[host] = HostBucket(rate, max(1.0, burst))
+        return bucket
+
+    def acquire(self, host, priority, ticket):
+        """Take a token for host now and return True, or queue ticket and return False"""
+        with self.cond:
+            bucket = self.bucket(host)
+            if bucket.rate <= 0:
+                return True
+            bucket.refill(time.monotonic())
+            if not bucket.queue and bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return True
+            flow = search_flow.get()
+            turn = bucket.turns.get(flow, 0)
+            bucket.turns[flow] = turn + 1
+            heapq.heappush(bucket.queue, (priority, turn, next(self.sequence), ticket))
+            # Checked on every queued request so a forked worker starts its own
+            if self.dispatcher is None or not self.dispatcher.is_alive():
+                self.dispatcher = threading.Thread(target=self.dispatch, name='request-scheduler', daemon=True)
+                self.dispatcher.start()
+            self.cond.notify()
+            return False
+
+    def cancel(self, ticket):
+        """Withdraw a queued ticket; False if it was granted in the meantime"""
+        with self.cond:
+            if ticket.granted:
+                return False
+            ticket.cancelled = True
+            return True
+
+    def dispatch(self):
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                wake_in = None
+                for bucket in self.buckets.values():
+                    if not bucket.queue:
+                        continue
+                    bucket.refill(now)
+                    while bucket.queue and bucket.tokens >= 1:
+                        ticket = heapq.heappop(bucket.queue)[-1]
+                        if not ticket.cancelled:
+                            bucket.tokens -= 1
+                            ticket.grant()
+                    if bucket.queue:
+                        next_token = (1 - bucket.tokens) / bucket.rate
+                        wake_in = next_token if wake_in is None else min(wake_in, next_token)
+                    else:
+                        bucket.turns.clear()
+                self.cond.wait(wake_in)
+
+    def priority(self, priority):
+        return priority + PRIORITY_BACKGROUND if background_fetch.get() else priority
+
+    def wait(self, url, priority=PRIORITY_PAGE, max_wait=SCHEDULER_MAX_WAIT):
+        """Block until url's host may be requested.
+
+        Returns the seconds spent waiting, or None if no turn came within max_wait.
+        """
+        host = urlparse(url).netloc
+        priority = self.priority(priority)
+        started = time.monotonic()
+        ticket = SchedulerTicket(event=threading.Event())
+        if not self.acquire(host, priority, ticket):
+            if not ticket.event.wait(max_wait) and self.cancel(ticket):
+                return None
+        return self.waited(host, priority, started)
+
+    async def wait_async(self, url, priority=PRIORITY_PAGE, max_wait=SCHEDULER_MAX_WAIT):
+        """wait() for coroutines: waits on the running loop instead of blocking it"""
+        host = urlparse(url).netloc
+        priority = self.priority(priority)
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        ticket = SchedulerTicket(loop=loop, future=loop.create_future())
+        if not self.acquire(host, priority, ticket):
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.future), max_wait)
+            except asyncio.TimeoutError:
+                if self.cancel(ticket):
+                    return None
+            except asyncio.CancelledError:
+                self.cancel(ticket)
+                raise
+        return self.waited(host, priority, started)
+
+    def waited(self, host, priority, started):
+        elapsed = time.monotonic() - started
+        metrics.observe('upstream_queue_wait_seconds', elapsed, host, PRIORITY_NAMES[priority])
+        return elapsed
+
+    def depths(self):
+        """{(host,): requests queued} for every host seen"""
+        with self.cond:
+            return {(host,): sum(1 for entry in bucket.queue if not entry[-1].cancelled)
+                    for host, bucket in self.buckets.items()}
+
+request_scheduler = RequestScheduler()
+metrics.histogram('upstream_queue_wait_seconds', 'Time an upstream request waited for its host to allow it',
+                  ('host', 'priority'), QUEUE_WAIT_BUCKETS)
+metrics.gauge('upstream_queue_depth', 'Upstream requests waiting for their host to allow them', ('host',),
+              collect=request_scheduler.depths)
+
+class EngineLoop:
+    """Dedicated asyncio event loop, on its own thread, that runs searches.
+
+    Native async engines multiplex all their upstream requests on this one
+    thread through a shared aiohttp session, and sync engines are driven from
+    it through SyncEngineAdapter. The loop starts on first use so that each
+    worker process gets its own after a fork.
+    """
+    def __init__(self):
+        self.loop = None
+        self.session = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.loop is None:
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(lookup_executor)
+                threading.Thread(target=loop.run_forever, name='engine-loop', daemon=True).start()
+                self.loop = loop
+        return self.loop
+
+    def submit(self, coro):
+        """Schedule coro on the engine loop and return a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def run(self, coro, timeout=None):
+        """Run coro on the engine loop and block the calling thread for its result"""
+        return self.submit(coro).result(timeout)
+
+    async def wait(self, coro):
+        """Await coro on the engine loop from another event loop"""
+        return await asyncio.wrap_future(self.submit(coro))
+
+    def get_session(self):
+        # Only called from coroutines running on the engine loop
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=ASYNC_MAX_CONNECTIONS, limit_per_host=POOL_MAXSIZE)
+            self.session = aiohttp.ClientSession(connector=connector, auto_decompress=False, headers={
+                'User-Agent': USER_AGENT,
+                'Accept-Encoding': ACCEPT_ENCODING
+            })
+        return self.session
+
+    def close(self):
+        """Close the aiohttp session and stop the loop"""
+        with self.lock:
+            loop, session = self.loop, self.session
+            self.loop = self.session = None
+        if loop is None:
+            return
+        if session is not None:
+            asyncio.run_coroutine_threadsafe(session.close(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+
+engine_loop = EngineLoop()
+
+class SharedState:
+    """Result cache entries and open circuits shared by all worker processes.
+
+    Every worker keeps its own ResultCache and EngineHealth in memory; this
+    SQLite store behind them lets a worker reuse a response another worker
+    already fetched, and skip an engine whose circuit another worker opened.
+    Values are pickled and expiry times are wall-clock, so they mean the same
+    in every process. Like the other SQLite stores it logs and misses rather
+    than fail a search. Off unless SHARED_STATE=1.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS circuits (engine TEXT PRIMARY KEY, open_until REAL NOT NULL);
+    """
+    # Seconds between sweeps of expired cache rows
+    PRUNE_INTERVAL = 300
+
+    def __init__(self, path=SHARED_STATE_PATH, enabled=SHARED_STATE):
+        self.path = path
+        self.enabled = enabled
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.circuits = {}  # engine id -> wall-clock time its shared circuit closes
+        self.circuits_read_at = 0.0
+        self.next_prune = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+
+    def connect(self):
+        # One connection per thread, opened lazily in the process that uses it
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.SCHEMA)
+            self.local.conn = conn
+        return conn
+
+    def key(self, key):
+        return '\x1f'.join(key)
+
+    def get(self, key):
+        """Return (value, seconds until it expires) for a fresh shared entry, or None"""
+        try:
+            row = self.connect().execute('SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?',
+                                         (self.key(key), time.time())).fetchone()
+            value = pickle.loads(row[0]) if row else None
+        except (sqlite3.Error, pickle.UnpicklingError) as e:
+            self.errors += 1
+            logger.error(f"Shared state lookup failed: {str(e)}")
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value, row[1] - time.time()
+
+    def expires_in(self, key):
+        """Seconds until the shared entry for key expires, or None if there is none"""
+        try:
+            row = self.connect().execute('SELECT expires_at FROM cache WHERE key = ?', (self.key(key),)).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Shared state lookup failed: {str(e)}")
+            return None
+        return row[0] - time.time() if row else None
+
+    def put(self, key, value, lifetime):
+        """Share value under key for lifetime seconds"""
+        try:
+            conn = self.connect()
+            now = time.time()
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                             (self.key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now + lifetime))
+                if now >= self.next_prune:
+                    self.next_prune = now + self.PRUNE_INTERVAL
+                    conn.execute('DELETE FROM cache WHERE expires_at < ?', (now,))
+            self.stores += 1
+        except (sqlite3.Error, pickle.PicklingError) as e:
+            self.errors += 1
+            logger.error(f"Shared state store failed: {str(e)}")
+
+    def open_circuit(self, engine_id, cooldown):
+        """Tell the other workers the engine's circuit is open for cooldown seconds"""
+        self.write_circuit('INSERT OR REPLACE INTO circuits (engine, open_until) VALUES (?, ?)',
+                           (engine_id, time.time() + cooldown))
+
+    def close_circuit(self, engine_id):
+        self.write_circuit('DELETE FROM circuits WHERE engine = ?', (engine_id,))
+
+    def write_circuit(self, sql, params):
+        try:
+            conn = self.connect()
+            with conn:
+                conn.execute(sql, params)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Shared state store failed: {str(e)}")
+        with self.lock:
+            self.circuits_read_at = 0.0
+
+    def circuit_open_for(self, engine_id):
+        """Seconds the engine's circuit stays open according to the other workers, 0 if closed.
+
+        Circuits are reread at most every SHARED_STATE_SYNC seconds.
+        """
+        now = time.monotonic()
+        with self.lock:
+            stale = now >= self.circuits_read_at + SHARED_STATE_SYNC
+            if stale:
+                self.circuits_read_at = now
+        if stale:
+            try:
+                circuits = dict(self.connect().execute('SELECT engine, open_until FROM circuits'))
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.error(f"Shared state lookup failed: {str(e)}")
+                circuits = {}
+            with self.lock:
+                self.circuits = circuits
+        with self.lock:
+            return max(0.0, self.circuits.get(engine_id, 0.0) - time.time())
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "errors": self.errors
+        }
+
+shared_state = SharedState()
+
+class EngineCircuit:
+    """Health state of one engine, guarded by EngineHealth's lock"""
+    def __init__(self, window, cooldown):
+        self.outcomes = deque(maxlen=window)  # (ok, latency) per request
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.cooldown = cooldown
+        self.probe_started = 0.0
+
+class EngineHealth:
+    """Per-engine circuit breaker and latency tracker fed by retrieve_url.
+
+    Request outcomes land in a sliding window per engine. Once enough of the
+    window has failed the circuit opens: the engine's requests are refused
+    without touching the network and fan-out skips it until the cooldown
+    ends. The next request is then let through as a half-open probe, which
+    closes the circuit on success or reopens it with a doubled cooldown.
+    Request timeouts follow the p95 latency of recent successful requests.
+    """
+    def __init__(self, window=HEALTH_WINDOW, min_requests=HEALTH_MIN_REQUESTS,
+                 failure_rate=HEALTH_FAILURE_RATE, cooldown=HEALTH_COOLDOWN, max_cooldown=HEALTH_MAX_COOLDOWN,
+                 min_timeout=UPSTREAM_TIMEOUT_MIN, max_timeout=UPSTREAM_TIMEOUT, p95_factor=TIMEOUT_P95_FACTOR):
+        self.window = window
+        self.min_requests = min_requests
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.p95_factor = p95_factor
+        self.circuits = {}
+        self.lock = threading.Lock()
+
+    def circuit(self, engine_id):
+        # Callers hold the lock
+        circuit = self.circuits.get(engine_id)
+        if circuit is None:
+            circuit = self.circuits[engine_id] = EngineCircuit(self.window, self.cooldown)
+        return circuit
+
+    def available(self, engine_id):
+        """Whether a search on the engine may start now"""
+        with self.lock:
+            circuit = self.circuit(engine_id)
+            self.adopt_shared(engine_id, circuit)
+            if circuit.state == 'open':
+                return time.monotonic() >= circuit.opened_at + circuit.cooldown
+            if circuit.state == 'half_open':
+                return self.probe_expired(circuit, time.monotonic())
+            return True
+
+    def allow(self, engine_id):
+        """Whether an upstream request may be sent, claiming the probe if one is due"""
+        with self.lock:
+            circuit = self.circuit(engine_id)
+            self.adopt_shared(engine_id, circuit)
+            now = time.monotonic()
+            if circuit.state == 'closed':
+                return True
+            if circuit.state == 'open' and now < circuit.opened_at + circuit.cooldown:
+                return False
+            if circuit.state == 'half_open' and not self.probe_expired(circuit, now):
+                return False
+            circuit.state = 'half_open'
+            circuit.probe_started = now
+            return True
+
+    def adopt_shared(self, engine_id, circuit):
+        # Callers hold the lock. A circuit another worker opened opens here
+        # too, for what is left of its cooldown.
+        if circuit.state == 'closed' and shared_state.enabled:
+            open_for = shared_state.circuit_open_for(engine_id)
+            if open_for > 0:
+                circuit.state = 'open'
+                circuit.opened_at = time.monotonic()
+                circuit.cooldown = open_for
+
+    def probe_expired(self, circuit, now):
+        # A probe whose outcome never arrived (e.g. its search was cancelled)
+        # must not hold the circuit half-open forever
+        return now >= circuit.probe_started + 2 * self.max_timeout
+
+    def record(self, engine_id, ok, latency):
+        """Account one upstream request outcome"""
+        with self.lock:
+            circuit = self.circuit(engine_id)
+            circuit.outcomes.append((ok, latency))
+            if circuit.state == 'half_open':
+                if ok:
+                    logger.info(f"Circuit for {engine_id} closed after a successful probe")
+                    circuit.state = 'closed'
+                    circuit.cooldown = self.cooldown
+                    circuit.outcomes.clear()
+                    circuit.outcomes.append((ok, latency))
+                    if shared_state.enabled:
+                        shared_state.close_circuit(engine_id)
+                else:
+                    self.open(engine_id, circuit, min(circuit.cooldown * 2, self.max_cooldown))
+            elif circuit.state == 'closed' and not ok and len(circuit.outcomes) >= self.min_requests:
+                failures = sum(1 for outcome_ok, _ in circuit.outcomes if not outcome_ok)
+                if failures / len(circuit.outcomes) >= self.failure_rate:
+                    self.open(engine_id, circuit, self.cooldown)
+
+    def open(self, engine_id, circuit, cooldown):
+        logger.warning(f"Circuit for {engine_id} opened for {cooldown:.0f}s")
+        circuit.state = 'open'
+        circuit.opened_at = time.monotonic()
+        circuit.cooldown = cooldown
+        if shared_state.enabled:
+            shared_state.open_circuit(engine_id, cooldown)
+
+    def timeout(self, engine_id):
+        """Request timeout for the engine from its recent p95 latency"""
+        with self.lock:
+            latencies = sorted(latency for ok, latency in self.circuit(engine_id).outcomes if ok)
+        if len(latencies) < self.min_requests:
+            return self.max_timeout
+        p95 = latencies[math.ceil(0.95 * len(latencies)) - 1]
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.p95_factor))
+
+    def snapshot(self, engine_id):
+        """Health block for one engine, as reported by /test"""
+        timeout = self.timeout(engine_id)
+        with self.lock:
+            circuit = self.circuit(engine_id)
+            outcomes = list(circuit.outcomes)
+            retry_in = max(0.0, circuit.opened_at + circuit.cooldown - time.monotonic())
+            state = circuit.state
+        latencies = sorted(latency for ok, latency in outcomes if ok)
+        return {
+            "state": state,
+            "requests": len(outcomes),
+            "success_rate": round(len(latencies) / len(outcomes), 4) if outcomes else None,
+            "p95_latency": round(latencies[math.ceil(0.95 * len(latencies)) - 1], 3) if latencies else None,
+            "timeout": round(timeout, 3),
+            "retry_in": round(retry_in, 1) if state == 'open' else 0.0
+        }
+
+engine_health = EngineHealth()
+
+metrics.gauge('engine_circuit_open', 'Whether the engine circuit is open (1) or half-open probing (0.5)', ('engine',),
+              collect=lambda: {(engine_id,): {'closed': 0, 'half_open': 0.5, 'open': 1}[circuit.state]
+                               for engine_id, circuit in list(engine_health.circuits.items())})
+metrics.gauge('engine_timeout_seconds', 'Current adaptive upstream timeout', ('engine',),
+              collect=lambda: {(engine_id,): engine_health.timeout(engine_id)
+                               for engine_id in list(engine_health.circuits)})
+
+class RelevanceStats:
+    """Recent search outcomes of one engine in one category, guarded by EngineRelevance's lock"""
+    def __init__(self, window):
+        self.found = deque(maxlen=window)  # whether each upstream search found anything
+        self.skipped = 0
+
+class EngineRelevance:
+    """Per-engine, per-category profile of how often searches find anything.
+
+    Fed by every upstream engine search, it decides which engines a site=all
+    search may leave out: those that do not cover the requested category at
+    all, and those that have rarely found anything in it lately. Skipped
+    engines are reported in the response's sites block with the reason.
+    Every probe_every-th skip of an unlikely engine is searched in the
+    background at low priority instead, so the profile keeps learning and an
+    engine that starts finding results again is let back in.
+    """
+    REASONS = {
+        'circuit_open': 'circuit is open',
+        'category': 'category not covered',
+        'unlikely': 'rarely finds results in this category'
+    }
+
+    def __init__(self, window=RELEVANCE_WINDOW, min_searches=RELEVANCE_MIN_SEARCHES,
+                 min_hit_rate=RELEVANCE_MIN_HIT_RATE, probe_every=RELEVANCE_PROBE_EVERY):
+        self.window = window
+        self.min_searches = min_searches
+        self.min_hit_rate = min_hit_rate
+        self.probe_every = probe_every
+        self.profiles = {}  # (engine id, category) -> RelevanceStats
+        self.probes = set()  # running background searches, kept referenced until they finish
+        self.lock = threading.Lock()
+
+    def profile(self, engine_id, category):
+        # Callers hold the lock
+        profile = self.profiles.get((engine_id, category))
+        if profile is None:
+            profile = self.profiles[(engine_id, category)] = RelevanceStats(self.window)
+        return profile
+
+    def record(self, engine_id, category, found):
+        """Account one upstream search of the engine and whether it found anything"""
+        with self.lock:
+            self.profile(engine_id, category).found.append(found)
+
+    def hit_rate(self, engine_id, category):
+        """Share of recent searches that found something, or None while too few were seen"""
+        with self.lock:
+            profile = self.profiles.get((engine_id, category))
+            found = list(profile.found) if profile is not None else []
+        if len(found) < max(1, self.min_searches):
+            return None
+        return sum(found) / len(found)
+
+    def covers(self, engine, category):
+        # Engines with no categories of their own search everything
+        return category == 'all' or category in engine.supported_categories or list(engine.supported_categories) == ['all']
+
+    def skip_reason(self, engine, category):
+        """Why a site=all search should leave the engine out, or None to search it"""
+        if not self.covers(engine, category):
+            return 'category'
+        if self.min_hit_rate > 0:
+            hit_rate = self.hit_rate(engine.id, category)
+            if hit_rate is not None and hit_rate < self.min_hit_rate:
+                return 'unlikely'
+        return None
+
+    def probe_due(self, engine_id, category):
+        """Count a skip as unlikely, returning True when it should be probed instead"""
+        with self.lock:
+            profile = self.profile(engine_id, category)
+            profile.skipped += 1
+            return self.probe_every > 0 and profile.skipped % self.probe_every == 0
+
+    def probe(self, api_id, api, query, category, limit=None, min_seeds=0):
+        """Search an unlikely engine in the background; call on the engine loop"""
+        async def run():
+            # Its upstream requests wait behind those of user searches
+            background_fetch.set(True)
+            try:
+                await cached_engine_search(api_id, api, query, category, limit, min_seeds)
+            except Exception as e:
+                logger.info(f"Background search on {api_id} failed: {str(e)}")
+
+        logger.info(f"Probing {api_id} for '{query}' in {category} in the background")
+        task = asyncio.ensure_future(run())
+        self.probes.add(task)
+        task.add_done_callback(self.probes.discard)
+
+    def stats(self):
+        with self.lock:
+            profiles = {key: (list(profile.found), profile.skipped) for key, profile in self.profiles.items()}
+        stats = {}
+        for (engine_id, category), (found, skipped) in sorted(profiles.items()):
+            stats.setdefault(engine_id, {})[category] = {
+                "searches": len(found),
+                "hit_rate": round(sum(found) / len(found), 4) if found else None,
+                "skipped": skipped
+            }
+        return stats
+
+engine_relevance = EngineRelevance()
+
+metrics.gauge('engine_hit_rate', 'Share of recent upstream searches that found results', ('engine', 'category'),
+              collect=lambda: {(engine_id, category): profile["hit_rate"]
+                               for engine_id, categories in engine_relevance.stats().items()
+                               for category, profile in categories.items() if profile["hit_rate"] is not None})
+
+# Display names of the categories engines map, in menu order
+CATEGORY_NAMES = {
+    'all': 'All Categories',
+    'movies': 'Movies',
+    'tv': 'TV Shows',
+    'music': 'Music',
+    'games': 'Games',
+    'software': 'Software',
+    'anime': 'Anime',
+    'books': 'Books'
+}
+
+class EngineRegistry:
+    """The torrent site engines, each instantiated once when its class registers.
+
+    Requests pick engines from here instead of building their own, so an
+    engine is a long-lived object; per-engine state belongs on it or is keyed
+    by its id (connection pools, health, caches). The site and category
+    listings the API serves are generated from what the engines declare and
+    encoded once.
+    """
+    def __init__(self):
+        self.engines = {}  # engine id -> engine, in registration order
+        self.listings = {}  # listing name -> (JSON body, ETag)
+
+    def register(self, engine_class):
+        """Class decorator: add an instance of engine_class under its id"""
+        if engine_class.id in self.engines:
+            raise ValueError(f"Engine id '{engine_class.id}' is already registered")
+        self.engines[engine_class.id] = engine_class()
+        self.listings.clear()
+        return engine_class
+
+    def select(self, site='all'):
+        """The engines a search of site runs, as {engine id: engine}"""
+        if site == 'all':
+            return dict(self.engines)
+        return {site: self.engines[site]} if site in self.engines else {}
+
+    def check_category(self, category, site='all'):
+        """Raise ValueError unless category can be searched on site.
+
+        A single site must support it; site=all needs one engine that does,
+        and skips the rest.
+        """
+        selected = self.select(site).values()
+        supported = [name for engine in selected for name in engine.supported_categories]
+        if selected and category not in supported:
+            names = ', '.join(dict.fromkeys(supported))
+            where = 'any site' if site == 'all' else f"site {site}"
+            raise ValueError(f"category {category} is not supported by {where}; use one of: {names}")
+
+    def capabilities(self, engine):
+        capabilities = ['async' if isinstance(engine, AsyncTorrentAPI) else 'sync']
+        if engine.detail_pages:
+            capabilities.append('detail_pages')
+        return capabilities
+
+    def sites(self):
+        sites = [{"id": "all", "name": "All Sites"}]
+        for engine in self.engines.values():
+            sites.append({"id": engine.id, "name": engine.name, "categories": list(engine.supported_categories),
+                          "capabilities": self.capabilities(engine)})
+        return sites
+
+    def categories(self):
+        supported = {}
+        for engine in self.engines.values():
+            for category in engine.supported_categories:
+                supported.setdefault(category, []).append(engine.id)
+        # Known categories first in menu order, then any an engine added
+        ordered = [category for category in CATEGORY_NAMES if category in supported]
+        ordered += [category for category in supported if category not in CATEGORY_NAMES]
+        return [{"id": category, "name": CATEGORY_NAMES.get(category, category.capitalize()),
+                 "sites": supported[category]} for category in ordered]
+
+    def listing(self, name):
+        """The 'sites' or 'categories' listing as (JSON body, ETag), built once"""
+        cached = self.listings.get(name)
+        if cached is None:
+            body = json_dumps(getattr(self, name)())
+            cached = self.listings[name] = (body, hashlib.sha1(body).hexdigest())
+        return cached
+
+engines = EngineRegistry()
+
+class PageStream:
+    """The decoded text of one upstream request, fetched as it is iterated.
+
+    Every outcome is logged and accounted in the engine's metrics and health
+    exactly once, as it was for whole-body requests. complete is set once the
+    whole body has arrived; after an error or a body over MAX_BODY_SIZE the
+    chunks already yielded stand but complete stays False.
+    """
+    def __init__(self, api, url, request_data=None, timeout=None, priority=PRIORITY_PAGE):
+        self.api = api
+        self.url = url
+        self.request_data = request_data
+        self.timeout = timeout
+        self.priority = priority
+        self.complete = False
+
+    def __iter__(self):
+        api, url = self.api, self.url
+        if not api.circuit_allows(url):
+            return
+        if request_scheduler.wait(url, self.priority) is None:
+            api.throttled(url)
+            return
+        timeout = engine_health.timeout(api.id) if self.timeout is None else self.timeout
+        started = time.perf_counter()
+        size = 0
         try:
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/94.0.4606.81 Safari/537.36'}
-            
             logger.info(f"Requesting URL: {url}")
             
-            if request_data:
-                request = urllib.request.Request(url, request_data, headers)
-            else:
-                request = urllib.request.Request(url, None, headers)
+            with transport.request(url, self.request_data, timeout, stream=True) as response:
+                response.raise_for_status()
                 
-            response = urllib.request.urlopen(request, timeout=timeout)
+                # Read still encoded, so the decoder inflates in bounded steps
+                decoder = PageDecoder.for_response(response.headers)
+                for data in response.raw.stream(STREAM_CHUNK_SIZE, decode_content=False):
+                    text = decoder.feed(data)
+                    size = decoder.size
+                    if text:
+                        yield text
+                text = decoder.close()
+                size = decoder.size
             
-            # Capture the response data
-            data = response.read()
+            api.request_succeeded(url, started, size)
+            self.complete = True
+            if text:
+                yield text
             
-            # Check if gzip encoded
-            if data[:2] == b'\x1f\x8b':
-                with io.BytesIO(data) as stream, gzip.GzipFile(fileobj=stream) as gzipper:
-                    data = gzipper.read()
-
-            # Determine charset
-            charset = 'utf-8'
-            try:
-                content_type = response.getheader('Content-Type', '')
-                if 'charset=' in content_type:
-                    charset = content_type.split('charset=', 1)[1]
-            except IndexError:
-                pass
-
-            # Decode the data
-            dataStr = data.decode(charset, 'replace')
-            dataStr = dataStr.replace('"', '\\"')  # Escape quotes
-            dataStr = html.unescape(dataStr)
-            
-            logger.info(f"Successfully retrieved data from {url}")
-            return dataStr
-            
-        except urllib.error.HTTPError as e:
-            logger.error(f"HTTP Error {e.code} for {url}: {e.reason}")
-            return ""
-        except urllib.error.URLError as e:
-            logger.error(f"URL Error for {url}: {e.reason}")
-            return ""
-        except socket.timeout:
-            logger.error(f"Socket timeout for {url}")
-            return ""
+        except GeneratorExit:
+            # The consumer stopped reading; the site answered fine so far
+            if not self.complete:
+                api.record_request(started, 'ok', size)
+            raise
         except Exception as e:
-            logger.error(f"Error retrieving {url}: {str(e)}")
-            return ""
+            api.request_failed(url, started, e, size)
+
+# Transport errors meaning the site did not answer in time, or at all, from
+# either the requests or the aiohttp path
+TIMEOUT_ERRORS = (requests.exceptions.Timeout, urllib3.exceptions.ReadTimeoutError, asyncio.TimeoutError)
+CONNECTION_ERRORS = (requests.exceptions.ConnectionError, urllib3.exceptions.ProtocolError) + (
+    (aiohttp.ClientError,) if aiohttp is not None else ())
+
+# Base Torrent API class
+class BaseTorrentAPI:
+    # Engine id, as used for site= and in metric labels
+    id = None
+    # Seconds a search result from this engine stays fresh in the result cache
+    cache_ttl = RESULT_CACHE_TTL
+    # Whether results need their detail page fetched to get a magnet link
+    detail_pages = False
+
+    def retrieve_url(self, url, request_data=None, timeout=None, priority=PRIORITY_PAGE):
+        """Request data from API with improved error handling and timeouts.
+
+        Returns the whole decoded page, or "" if the request failed at any
+        point; see stream_url for how it is fetched.
+        """
+        stream = self.stream_url(url, request_data, timeout, priority)
+        page = ''.join(stream)
+        return page if stream.complete else ""
+
+    def stream_url(self, url, request_data=None, timeout=None, priority=PRIORITY_PAGE):
+        """Request url and return its decoded text as an iterable of chunks.
+
+        The request is made when iteration starts. It first waits for its turn
+        at the host's rate limit, ahead of other requests with a lower
+        priority; the body is then decoded as it arrives, so a parser can work
+        through a page while it downloads without the body ever being held
+        whole. Failures end the stream early, leaving complete False.
+        """
+        return PageStream(self, url, request_data, timeout, priority)
+
+    def circuit_allows(self, url):
+        """Whether the engine's circuit lets a request to url through"""
+        if engine_health.allow(self.id):
+            return True
+        logger.info(f"Skipping {url}: circuit for {self.id} is open")
+        note_fetch_failure('circuit_open')
+        return False
+
+    def request_succeeded(self, url, started, size):
+        self.record_request(started, 'ok', size)
+        logger.info(f"Successfully retrieved data from {url}")
+
+    def request_failed(self, url, started, error, size=0):
+        """Account and log an upstream request that raised error, from either transport"""
+        if isinstance(error, requests.exceptions.HTTPError):
+            status, reason = error.response.status_code, error.response.reason
+        elif aiohttp is not None and isinstance(error, aiohttp.ClientResponseError):
+            status, reason = error.status, error.message
+        else:
+            status = None
+        if status is not None:
+            outcome = 'http_error'
+            self.record_request(started, outcome, size, healthy=self.healthy_status(status))
+            logger.error(f"HTTP Error {status} for {url}: {reason}")
+        elif isinstance(error, TIMEOUT_ERRORS):
+            outcome = 'timeout'
+            self.record_request(started, outcome, size)
+            logger.error(f"Timeout for {url}")
+        elif isinstance(error, CONNECTION_ERRORS):
+            outcome = 'connection_error'
+            self.record_request(started, outcome, size)
+            logger.error(f"Connection Error for {url}: {str(error)}")
+        elif isinstance(error, BodyTooLarge):
+            outcome = 'too_large'
+            self.record_request(started, outcome, size)
+            logger.error(f"Gave up on {url}: {str(error)}")
+        else:
+            outcome = 'error'
+            self.record_request(started, outcome, size)
+            logger.error(f"Error retrieving {url}: {str(error)}")
+        # A 4xx other than rate limiting is the site's answer, e.g. a 404 for
+        # a search with no hits: an empty result, not a failure
+        if status is None or not self.healthy_status(status):
+            note_fetch_failure(f"HTTP {status}" if status is not None else outcome)
+
+    def throttled(self, url):
+        # The site was never asked, so its health is left alone
+        metrics.inc('upstream_requests_total', self.id, 'throttled')
+        logger.warning(f"Gave up on {url}: no turn at the host's rate limit within {SCHEDULER_MAX_WAIT}s")
+        note_fetch_failure('throttled')
+        return ""
+
+    def record_request(self, started, outcome, size=0, healthy=None):
+        """Account one upstream request in the engine's metrics and health"""
+        elapsed = time.perf_counter() - started
+        metrics.observe('upstream_request_duration_seconds', elapsed, self.id)
+        metrics.inc('upstream_requests_total', self.id, outcome)
+        if size:
+            metrics.inc('upstream_response_bytes_total', self.id, amount=size)
+        engine_health.record(self.id, outcome == 'ok' if healthy is None else healthy, elapsed)
+
+    def healthy_status(self, status):
+        # A 4xx other than rate limiting still means the site is up
+        return status < 500 and status != 429
     
     def format_size(self, size_bytes):
         """Format bytes to human readable size"""
@@ -103,7 +1439,27 @@ class BaseTorrentAPI:
             return f"{size_bytes/1024**4:.2f} TB"
     
     def get_trackers_string(self):
-        return '&'.join(urlencode({'tr': tracker}) for tracker in trackers_list)
+        return TRACKERS_QUERY
+
+    def top_results(self, results, limit=None, min_seeds=0):
+        """Drop results below min_seeds and keep the best `limit` by seeds"""
+        if min_seeds:
+            results = [result for result in results if result.seeds >= min_seeds]
+        if limit and len(results) > limit:
+            results = heapq.nlargest(limit, results, key=lambda result: result.seeds)
+        return results
+
+    def can_stop_paging(self, results, limit=None, min_seeds=0):
+        """Whether later pages of a seed-sorted listing can still reach the top `limit`.
+
+        Pages list torrents in descending seed order, so once `limit` results
+        clear min_seeds, or the last one falls below it, they cannot.
+        """
+        if not results:
+            return False
+        if min_seeds and results[-1].seeds < min_seeds:
+            return True
+        return bool(limit) and sum(1 for result in results if result.seeds >= min_seeds) >= limit
     
     def parse_size(self, size_str):
         """Convert human-readable size to bytes"""
@@ -128,12 +1484,1012 @@ class BaseTorrentAPI:
             elif 'TB' in unit or 'TIB' in unit:
                 return int(size_num * 1024**4)
             else:
-                return int(size_num)
-        except:
-            return 0
+                return int(size_num)
+        except:
+            return 0
+
+class RowParser:
+    """Precompiled, declarative parser for the result rows of a page.
+
+    row is a pattern matching one result row. Its named groups become fields
+    directly; a group named 'row' marks the span the field patterns are
+    searched in (the whole match otherwise). When end is given, row only
+    matches the opening of a row and the row runs to the next occurrence of
+    the literal end, which str.find locates far faster than a lazy .*? scan.
+    fields maps names to patterns with one capture group each, taking the
+    first match in the row or None. Rows without the optional require
+    substring are skipped before any field is searched. Everything is
+    compiled once per engine class and searched against the page in place, so
+    no per-row copies of the HTML are made.
+
+    A parser with an end can also take the page as an iterable of text chunks,
+    such as an engine's stream_url(), and yields each row as soon as its end
+    has arrived, keeping only the unparsed tail of the page in memory. Its row
+    pattern must then end in a literal and match fewer than ROW_HOLDBACK
+    characters, so a match found in a partial page is the one the whole page
+    would give.
+    """
+    # Characters kept from a chunk without a row start, in case one begins there
+    ROW_HOLDBACK = 1024
+
+    def __init__(self, row, fields=None, require=None, end=None, flags=re.DOTALL):
+        self.row = re.compile(row, flags)
+        self.fields = [(name, re.compile(pattern)) for name, pattern in (fields or {}).items()]
+        self.require = require
+        self.end = end
+        self.row_fields = [name for name in self.row.groupindex if name != 'row']
+        self.has_row_group = 'row' in self.row.groupindex
+        # A full-row pattern with nothing else to search is matched in one
+        # findall; its groups must all be named fields, two or more, so each
+        # match is a tuple in row_fields order
+        self.whole_rows = (end is None and not self.fields and not require and not self.has_row_group
+                           and self.row.groups == len(self.row_fields) > 1)
+
+    def __set_name__(self, owner, name):
+        # Parse time is reported under the engine that declares the parser
+        self.engine = owner.id
+
+    def parse(self, page):
+        """Return a lazy iterator of field dicts for the rows of page, text or chunks"""
+        return PageRows(self, page)
+
+    def spans(self, page):
+        """Yield (match, text, start, end) for each row, text[start:end] being its field span"""
+        if not isinstance(page, str):
+            if self.end is not None:
+                yield from self.stream_spans(page)
+                return
+            page = ''.join(page)
+        if self.end is None:
+            for row_match in self.row.finditer(page):
+                start, end = row_match.span('row') if self.has_row_group else row_match.span()
+                yield row_match, page, start, end
+            return
+        pos = 0
+        while True:
+            row_match = self.row.search(page, pos)
+            if row_match is None:
+                return
+            start = row_match.end()
+            end = page.find(self.end, start)
+            if end == -1:
+                return
+            yield row_match, page, start, end
+            pos = end + len(self.end)
+
+    def stream_spans(self, chunks):
+        # spans() over a page arriving in chunks: text is the part of the page
+        # not parsed yet, extended one chunk at a time
+        text = ''
+        pos = 0
+        for chunk in chunks:
+            text = text[pos:] + chunk
+            pos = 0
+            while True:
+                row_match = self.row.search(text, pos)
+                if row_match is None:
+                    pos = max(pos, len(text) - self.ROW_HOLDBACK)
+                    break
+                start = row_match.end()
+                end = text.find(self.end, start)
+                if end == -1:
+                    # Wait for the rest of the row
+                    pos = row_match.start()
+                    break
+                yield row_match, text, start, end
+                pos = end + len(self.end)
+
+class PageRows:
+    """Rows of one page, parsed as they are iterated.
+
+    seen counts every row matched so far, including those skipped for lacking
+    the required substring, which is what the engines paginate on.
+    """
+    def __init__(self, parser, page):
+        self.parser = parser
+        self.page = page
+        self.seen = 0
+        self.elapsed = 0.0
+        self.resumed = 0.0
+
+    def __iter__(self):
+        if self.parser.whole_rows and isinstance(self.page, str):
+            return self.findall()
+        return self.each_row()
+
+    def findall(self):
+        # One C-level scan instead of a generator step per row; for
+        # LimeTorrents that per-row overhead outweighed the regex itself
+        parser = self.parser
+        started = time.perf_counter()
+        names = parser.row_fields
+        rows = [dict(zip(names, groups)) for groups in parser.row.findall(self.page)]
+        self.seen = len(rows)
+        self.elapsed = time.perf_counter() - started
+        metrics.observe('parse_duration_seconds', self.elapsed, parser.engine)
+        return iter(rows)
+
+    def each_row(self):
+        parser = self.parser
+        page = self.page if isinstance(self.page, str) else self.chunks(self.page)
+        # Only time spent in here counts as parsing, not the consumer's work
+        self.elapsed = 0.0
+        self.resumed = time.perf_counter()
+        for row_match, text, start, end in parser.spans(page):
+            self.seen += 1
+            if parser.require and text.find(parser.require, start, end) == -1:
+                continue
+            fields = {name: row_match.group(name) for name in parser.row_fields}
+            for name, pattern in parser.fields:
+                match = pattern.search(text, start, end)
+                fields[name] = match.group(1) if match else None
+            self.elapsed += time.perf_counter() - self.resumed
+            yield fields
+            self.resumed = time.perf_counter()
+        self.elapsed += time.perf_counter() - self.resumed
+        metrics.observe('parse_duration_seconds', self.elapsed, parser.engine)
+
+    def chunks(self, chunks):
+        # Nor is waiting for the next chunk to download
+        chunks = iter(chunks)
+        while True:
+            self.elapsed += time.perf_counter() - self.resumed
+            chunk = next(chunks, None)
+            self.resumed = time.perf_counter()
+            if chunk is None:
+                return
+            yield chunk
+
+# Detail page patterns shared by the engines that resolve them
+INFO_HASH_RE = re.compile(r'([A-F0-9]{40})', re.IGNORECASE)
+MAGNET_LINK_RE = re.compile(r'href="(magnet:[^"]+)"')
+# btih in a magnet link, hex or base32 encoded
+MAGNET_BTIH_RE = re.compile(r'urn:btih:([0-9a-f]{40}|[a-z2-7]{32})(?![0-9a-z])', re.IGNORECASE)
+BTIH_RE = re.compile(r'[0-9a-f]{40}|[a-z2-7]{32}', re.IGNORECASE)
+
+def normalize_info_hash(info_hash):
+    """Return a hex or base32 btih info-hash as lowercase hex, or None"""
+    if not info_hash or not BTIH_RE.fullmatch(info_hash):
+        return None
+    if len(info_hash) == 32:
+        return base64.b32decode(info_hash.upper()).hex()
+    return info_hash.lower()
+
+def info_hash_from_magnet(link):
+    """Return the lowercase hex btih info-hash of a magnet link, or None"""
+    match = MAGNET_BTIH_RE.search(link or '')
+    return normalize_info_hash(match.group(1)) if match else None
+
+class TorrentResult:
+    """One search result, as returned by every engine.
+
+    Results are slotted objects rather than dicts, and the strings shared by
+    all results of an engine (source, engine_url, category) are interned, so
+    a large result set costs little more than its names and links. Engines
+    that only know the info-hash pass info_hash instead of link; the magnet
+    link is then built when it is read, from the hash, the name and the
+    shared TRACKERS_QUERY. to_dict() gives the JSON shape of a result.
+    """
+    __slots__ = ('name', 'size', 'raw_size', 'seeds', 'leech', 'engine_url', 'desc_link', 'pub_date',
+                 'category', 'source', 'magnet', 'info_hash', 'sources')
+
+    def __init__(self, name, size, raw_size, seeds, leech, engine_url, desc_link, pub_date, category, source,
+                 link=None, info_hash=None):
+        self.name = name
+        self.size = size
+        self.raw_size = raw_size
+        self.seeds = int(seeds or 0)
+        self.leech = int(leech or 0)
+        self.engine_url = sys.intern(engine_url)
+        self.desc_link = desc_link
+        self.pub_date = pub_date
+        self.category = sys.intern(category)
+        self.source = sys.intern(source)
+        self.magnet = link
+        self.info_hash = info_hash
+        # Engines that returned this torrent, filled in by ResultMerger
+        self.sources = None
+
+    @property
+    def link(self):
+        if self.magnet is None and self.info_hash:
+            return f"magnet:?xt=urn:btih:{self.info_hash}&{urlencode({'dn': self.name})}&{TRACKERS_QUERY}"
+        return self.magnet
+
+    @link.setter
+    def link(self, link):
+        self.magnet = link
+
+    def btih(self):
+        """The lowercase hex info-hash identifying this torrent, or None"""
+        if self.magnet is None:
+            return normalize_info_hash(self.info_hash)
+        return info_hash_from_magnet(self.magnet)
+
+    def copy(self):
+        result = object.__new__(TorrentResult)
+        for slot in self.__slots__:
+            setattr(result, slot, getattr(self, slot))
+        return result
+
+    def to_dict(self):
+        return {
+            'link': self.link,
+            'name': self.name,
+            'size': self.size,
+            'raw_size': self.raw_size,
+            'seeds': self.seeds,
+            'leech': self.leech,
+            'engine_url': self.engine_url,
+            'desc_link': self.desc_link,
+            'pub_date': self.pub_date,
+            'category': self.category,
+            'source': self.source,
+            'info_hash': self.btih(),
+            'sources': self.sources or [self.source]
+        }
+
+def json_default(o):
+    """json.dumps default= hook for the result types in API responses"""
+    if isinstance(o, TorrentResult):
+        return o.to_dict()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def json_dumps(obj, sort_keys=False):
+    """Serialize obj, TorrentResult records included, to compact UTF-8 JSON bytes.
+
+    Uses orjson when it is installed and the stdlib json module otherwise.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return json.dumps(obj, default=json_default, sort_keys=sort_keys, ensure_ascii=False,
+                      separators=(',', ':')).encode()
+
+def json_loads(data):
+    """Parse a JSON document given as str or bytes, with orjson when installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class ResultJSONProvider(DefaultJSONProvider):
+    """jsonify() through json_dumps, so it handles TorrentResult records and uses orjson when available"""
+    def dumps(self, obj, **kwargs):
+        return json_dumps(obj, kwargs.get('sort_keys', self.sort_keys)).decode()
+
+    def loads(self, s, **kwargs):
+        return json_loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(json_dumps(obj, self.sort_keys), mimetype=self.mimetype)
+
+app.json = ResultJSONProvider(app)
+
+class AsyncTorrentAPI(BaseTorrentAPI, abc.ABC):
+    """Base class for engines written against asyncio.
+
+    search() and retrieve_url() are coroutines run on the engine loop, so a
+    search waiting on upstream holds no thread.
+    """
+    async def retrieve_url(self, url, request_data=None, timeout=None, priority=PRIORITY_PAGE):
+        """Request data from API without blocking the engine loop"""
+        if aiohttp is None:
+            return await asyncio.get_running_loop().run_in_executor(
+                fanout_executor, contextvars.copy_context().run, BaseTorrentAPI.retrieve_url, self, url,
+                request_data, timeout, priority)
+        if not self.circuit_allows(url):
+            return ""
+        if await request_scheduler.wait_async(url, priority) is None:
+            return self.throttled(url)
+        if timeout is None:
+            timeout = engine_health.timeout(self.id)
+        started = time.perf_counter()
+        size = 0
+        try:
+            logger.info(f"Requesting URL: {url}")
+            
+            session = engine_loop.get_session()
+            method = 'POST' if request_data else 'GET'
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'} if request_data else None
+            async with session.request(method, url, data=request_data, headers=headers,
+                                       timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                response.raise_for_status()
+                # Decoded chunk by chunk as it arrives, as in PageStream; the
+                # session leaves the Content-Encoding to the decoder
+                decoder = PageDecoder.for_response(response.headers)
+                chunks = []
+                async for data in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                    chunks.append(decoder.feed(data))
+                    size = decoder.size
+                chunks.append(decoder.close())
+                size = decoder.size
+            
+            self.request_succeeded(url, started, size)
+            return ''.join(chunks)
+            
+        except Exception as e:
+            self.request_failed(url, started, e, size)
+            return ""
+
+    @abc.abstractmethod
+    async def search(self, what, cat='all', limit=None, min_seeds=0):
+        """Return the engine's results for what as a list of TorrentResult"""
+
+class SyncEngineAdapter:
+    """Expose a synchronous engine through the AsyncTorrentAPI contract.
+
+    Blocking calls run on the fan-out thread pool, in a copy of the caller's
+    context so the request scheduler still knows which search they serve;
+    every other attribute is read from the wrapped engine.
+    """
+    def __init__(self, api):
+        self.api = api
+
+    def __getattr__(self, name):
+        return getattr(self.api, name)
+
+    async def retrieve_url(self, url, request_data=None, timeout=None, priority=PRIORITY_PAGE):
+        return await asyncio.get_running_loop().run_in_executor(
+            fanout_executor, contextvars.copy_context().run, self.api.retrieve_url, url, request_data, timeout,
+            priority)
+
+    async def search(self, what, cat='all', limit=None, min_seeds=0):
+        return await asyncio.get_running_loop().run_in_executor(
+            fanout_executor, contextvars.copy_context().run, self.api.search, what, cat, limit, min_seeds)
+
+def as_async(api):
+    """Return api with the async engine contract, adapting sync engines"""
+    return api if isinstance(api, AsyncTorrentAPI) else SyncEngineAdapter(api)
+
+class InfoHashCache:
+    """Persistent detail URL -> info-hash/magnet cache backed by SQLite.
+
+    A torrent's detail page always resolves to the same hash, so entries never
+    expire; the table is kept under max_entries by evicting the least recently
+    used rows. Lookups and stores never raise, a broken cache just misses.
+    """
+    def __init__(self, path=INFOHASH_CACHE_PATH, max_entries=INFOHASH_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.conn = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def connect(self):
+        # Opened lazily so the connection belongs to the process that uses it
+        if self.conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS infohash ('
+                              'url TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS infohash_last_used ON infohash (last_used)')
+        return self.conn
+
+    def get_many(self, urls):
+        """Return {url: value} for the cached urls and refresh their recency"""
+        if not urls:
+            return {}
+        found = {}
+        try:
+            with self.lock:
+                conn = self.connect()
+                for i in range(0, len(urls), 500):
+                    chunk = urls[i:i + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    found.update(conn.execute(
+                        f'SELECT url, value FROM infohash WHERE url IN ({placeholders})', chunk))
+                if found:
+                    now = time.time()
+                    conn.executemany('UPDATE infohash SET last_used = ? WHERE url = ?',
+                                     [(now, url) for url in found])
+                    conn.commit()
+                self.hits += len(found)
+                self.misses += len(urls) - len(found)
+        except sqlite3.Error as e:
+            logger.error(f"Info-hash cache lookup failed: {str(e)}")
+            return {}
+        return found
+
+    def put_many(self, values):
+        """Store {url: value} pairs, evicting the oldest rows past max_entries"""
+        if not values:
+            return
+        try:
+            with self.lock:
+                conn = self.connect()
+                now = time.time()
+                conn.executemany('INSERT OR REPLACE INTO infohash (url, value, last_used) VALUES (?, ?, ?)',
+                                 [(url, value, now) for url, value in values.items()])
+                self.stores += len(values)
+                excess = conn.execute('SELECT COUNT(*) FROM infohash').fetchone()[0] - self.max_entries
+                if excess > 0:
+                    conn.execute('DELETE FROM infohash WHERE url IN '
+                                 '(SELECT url FROM infohash ORDER BY last_used LIMIT ?)', (excess,))
+                    self.evictions += excess
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Info-hash cache store failed: {str(e)}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "max_entries": self.max_entries
+        }
+
+infohash_cache = InfoHashCache()
+
+class DetailResolver:
+    """Fetch torrent detail pages in parallel and extract a value from each.
+
+    Engines that need a second request per result (for the info-hash or the
+    magnet link) hand over all their detail URLs at once. Pages already in the
+    info-hash cache are answered without a request. Concurrency is capped
+    per host and the batch shares one time budget; pages still outstanding when
+    it runs out are simply left unresolved.
+
+    Fetches wait for their host in a queue per host, and only reach the
+    thread pool once the host has one of its per_host slots free, so a
+    backlog on one site never holds pool threads that another site's pages
+    could use.
+    """
+    def __init__(self, max_workers=DETAIL_WORKERS, per_host=DETAIL_PER_HOST):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='detail')
+        self.per_host = per_host
+        self.queues = {}  # host -> deque of (future, fn, args) waiting for a slot
+        self.active = {}  # host -> fetches running on the pool
+        self.lock = threading.Lock()
+
+    def submit(self, url, fn, *args):
+        """Run fn(*args) on the pool once url's host has a free slot, returning a Future"""
+        future = Future()
+        host = urlparse(url).netloc
+        with self.lock:
+            self.queues.setdefault(host, deque()).append((future, fn, args))
+        self.dispatch(host)
+        return future
+
+    def dispatch(self, host):
+        while True:
+            with self.lock:
+                waiting = self.queues.get(host)
+                if not waiting:
+                    self.queues.pop(host, None)
+                    return
+                if self.active.get(host, 0) >= self.per_host:
+                    return
+                future, fn, args = waiting.popleft()
+                # Fetches cancelled while queued (their budget ran out) are dropped
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.active[host] = self.active.get(host, 0) + 1
+            self.executor.submit(self.run, host, future, fn, args)
+
+    def run(self, host, future, fn, args):
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                self.active[host] -= 1
+                if not self.active[host]:
+                    del self.active[host]
+            self.dispatch(host)
+
+    def fetch(self, api, url, extract, deadline):
+        """Return (fetched, value); fetched is False if the budget ran out first"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False, None
+        page = api.retrieve_url(url, timeout=min(engine_health.timeout(api.id), max(1, remaining)),
+                                priority=PRIORITY_DETAIL)
+        return True, extract(page) if page else None
+
+    def resolve(self, api, urls, extract, budget=DETAIL_BUDGET):
+        """Return {url: value} for every detail page resolved within the budget"""
+        urls = list(dict.fromkeys(urls))
+        cached = infohash_cache.get_many(urls)
+        deadline = time.monotonic() + budget
+        futures = {}
+        for url in urls:
+            if url not in cached:
+                # Each fetch runs in a copy of the engine's context, for the request scheduler
+                futures[self.submit(url, contextvars.copy_context().run, self.fetch, api, url, extract,
+                                    deadline)] = url
+        if not futures:
+            return cached
+
+        done, not_done = wait(futures, timeout=budget)
+        for future in not_done:
+            future.cancel()
+
+        resolved = {}
+        skipped = len(not_done)
+        for future in done:
+            url = futures[future]
+            try:
+                fetched, value = future.result()
+            except Exception as e:
+                logger.error(f"Error resolving details for {url}: {str(e)}")
+                continue
+            if value:
+                resolved[url] = value
+            elif fetched:
+                logger.warning(f"Couldn't resolve details for {url}")
+            else:
+                skipped += 1
+
+        if skipped:
+            logger.warning(f"Detail budget exhausted for {api.name}: "
+                           f"{skipped} of {len(futures)} pages unresolved")
+        infohash_cache.put_many(resolved)
+        resolved.update(cached)
+        return resolved
+
+detail_resolver = DetailResolver()
+
+class CachedError:
+    """A failed fetch, cached by ResultCache in place of a value"""
+    __slots__ = ('error',)
+
+    def __init__(self, error):
+        self.error = error
+
+class ResultCache:
+    """In-memory LRU cache for search results with stale-while-revalidate.
+
+    Fresh entries are returned as is. Entries past their TTL but still inside
+    the stale window are returned immediately while one background refresh
+    runs. Concurrent misses for the same key wait on a single upstream fetch.
+    Cached values are shared between requests and must not be mutated. With
+    shared state on, a miss first looks for an entry another worker stored,
+    and every fetched value is stored there in turn. Failed fetches can be
+    cached too, unless a value is still cached: their error is raised again
+    until it expires, never stale.
+    """
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, stale_for=RESULT_CACHE_STALE):
+        self.max_entries = max_entries
+        self.stale_for = stale_for
+        self.entries = OrderedDict()  # key -> (value, expires_at)
+        self.inflight = {}  # key -> Future shared by everyone waiting on the fetch
+        self.tasks = set()  # running fetches, kept referenced until they finish
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.error_hits = 0
+        self.misses = 0
+        self.merged = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    async def get_or_fetch(self, key, fetch, ttl, error_ttl=0):
+        """Return the cached value for key, awaiting fetch() when needed.
+
+        ttl is a number of seconds or a function of the fetched value; a TTL
+        of zero or less leaves the value uncached. A fetch that raises is
+        cached for error_ttl seconds, the default 0 leaving it uncached.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                now = time.monotonic()
+                if isinstance(value, CachedError):
+                    if now < expires_at:
+                        self.error_hits += 1
+                        raise value.error
+                elif now < expires_at + self.stale_for:
+                    self.entries.move_to_end(key)
+                    if now < expires_at:
+                        self.hits += 1
+                    else:
+                        self.stale_hits += 1
+                        if key not in self.inflight:
+                            self.refreshes += 1
+                            self.start_fetch(key, fetch, ttl, error_ttl)
+                    return value
+
+            future = self.inflight.get(key)
+            if future is None:
+                self.misses += 1
+                future = self.start_fetch(key, fetch, ttl, error_ttl)
+            else:
+                self.merged += 1
+
+        # Shielded so a caller giving up does not cancel the fetch for the others
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def refresh(self, key, fetch, ttl, error_ttl=0):
+        """Fetch the value for key even if it is cached, and replace the entry.
+
+        A fetch already in flight for key is shared rather than repeated.
+        """
+        with self.lock:
+            future = self.inflight.get(key)
+            if future is None:
+                self.refreshes += 1
+                future = self.start_fetch(key, fetch, ttl, error_ttl, shared=False)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def peek(self, key):
+        """The cached value for key, fresh or stale, or None; counts as no lookup"""
+        with self.lock:
+            entry = self.entries.get(key)
+        return None if entry is None or isinstance(entry[0], CachedError) else entry[0]
+
+    def expires_in(self, key):
+        """Seconds until the entry for key expires, negative once stale, or None if not cached"""
+        with self.lock:
+            entry = self.entries.get(key)
+        return None if entry is None else entry[1] - time.monotonic()
+
+    def start_fetch(self, key, fetch, ttl, error_ttl=0, shared=True):
+        # Called with the lock held. shared=False skips the shared state
+        # lookup, for refreshes that must reach upstream
+        future = self.inflight[key] = Future()
+        task = asyncio.ensure_future(self.run_fetch(key, fetch, ttl, future, error_ttl,
+                                                    shared and shared_state.enabled))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return future
+
+    async def run_fetch(self, key, fetch, ttl, future, error_ttl=0, shared=False):
+        loop = asyncio.get_running_loop()
+        found = await loop.run_in_executor(None, shared_state.get, key) if shared else None
+        if found is not None:
+            value, lifetime = found
+            self.store(key, value, lifetime)
+            future.set_result(value)
+            return
+        try:
+            value = await fetch()
+        except Exception as e:
+            logger.error(f"Fetch for cache key {key} failed: {str(e)}")
+            with self.lock:
+                entry = self.entries.get(key)
+            if (entry is not None and not isinstance(entry[0], CachedError)
+                    and time.monotonic() < entry[1] + self.stale_for):
+                # A failed revalidation keeps serving the stale value until it
+                # runs out, rather than an error
+                error_ttl = 0
+            # Errors stay in this worker; another may well succeed
+            self.store(key, CachedError(e), error_ttl)
+            future.set_exception(e)
+            return
+
+        lifetime = ttl(value) if callable(ttl) else ttl
+        self.store(key, value, lifetime)
+        future.set_result(value)
+        if shared_state.enabled and lifetime > 0:
+            loop.run_in_executor(None, shared_state.put, key, value, lifetime)
+
+    def store(self, key, value, lifetime):
+        """Settle the fetch for key, caching value for lifetime seconds if positive"""
+        with self.lock:
+            self.inflight.pop(key, None)
+            if lifetime > 0:
+                self.entries[key] = (value, time.monotonic() + lifetime)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.error_hits + self.misses + self.merged
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "error_hits": self.error_hits,
+            "misses": self.misses,
+            "merged": self.merged,
+            "hit_rate": round((self.hits + self.stale_hits + self.error_hits) / lookups, 4) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "evictions": self.evictions
+        }
+
+result_cache = ResultCache()
+
+class SearchIndex:
+    """Local full-text index of every torrent the engines have returned.
+
+    Results with a btih info-hash are upserted into SQLite, keyed by the hash,
+    with an FTS5 index over the name. Writes are batched by a background
+    thread so searches never wait on the disk; each row keeps the seeds,
+    leech and source it was last seen with and when. Queries rank matches by
+    bm25 relevance, boosted by seeders discounted by how long ago they were
+    seen. Ranking costs time per match, so a query matching more than
+    SEARCH_INDEX_BROAD torrents, where every match is about as relevant, is
+    instead answered by walking the seeders index down until enough matches
+    are found. Like InfoHashCache, a broken index logs and finds nothing.
+    """
+    COLUMNS = ('info_hash', 'name', 'size', 'raw_size', 'seeds', 'leech', 'category', 'source',
+               'desc_link', 'engine_url', 'pub_date', 'last_seen')
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS torrents (
+            info_hash TEXT PRIMARY KEY, name TEXT NOT NULL, size TEXT, raw_size INTEGER,
+            seeds INTEGER NOT NULL, leech INTEGER NOT NULL, category TEXT, source TEXT,
+            desc_link TEXT, engine_url TEXT, pub_date INTEGER, last_seen REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS torrents_last_seen ON torrents (last_seen);
+        CREATE INDEX IF NOT EXISTS torrents_seeds ON torrents (seeds);
+        CREATE VIRTUAL TABLE IF NOT EXISTS torrents_fts USING fts5(
+            name, content='torrents', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2');
+        CREATE TRIGGER IF NOT EXISTS torrents_insert AFTER INSERT ON torrents BEGIN
+            INSERT INTO torrents_fts (rowid, name) VALUES (new.rowid, new.name);
+        END;
+        CREATE TRIGGER IF NOT EXISTS torrents_delete AFTER DELETE ON torrents BEGIN
+            INSERT INTO torrents_fts (torrents_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+        END;
+        CREATE TRIGGER IF NOT EXISTS torrents_rename AFTER UPDATE OF name ON torrents BEGIN
+            INSERT INTO torrents_fts (torrents_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+            INSERT INTO torrents_fts (rowid, name) VALUES (new.rowid, new.name);
+        END;
+    """
+    # A torrent keeps the name it was first indexed with; everything that
+    # describes the latest sighting is replaced
+    UPSERT = (f"INSERT INTO torrents ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+              "ON CONFLICT (info_hash) DO UPDATE SET seeds = excluded.seeds, leech = excluded.leech, "
+              "source = excluded.source, desc_link = excluded.desc_link, engine_url = excluded.engine_url, "
+              "last_seen = excluded.last_seen")
+    # Rows per write transaction
+    BATCH_SIZE = 5000
+
+    def __init__(self, path=SEARCH_INDEX_PATH, max_entries=SEARCH_INDEX_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.writes = queue.Queue(maxsize=SEARCH_INDEX_QUEUE)
+        self.writer = None
+        self.lock = threading.Lock()
+        self.next_prune = 0
+        self.queries = 0
+        self.stores = 0
+        self.dropped = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def connect(self):
+        # One connection per thread, opened lazily in the process that uses
+        # it; with WAL, queries read while the writer commits
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.SCHEMA)
+            self.local.conn = conn
+        return conn
+
+    def add(self, results):
+        """Queue TorrentResults for indexing without blocking.
+
+        Results without a btih hash are skipped; a batch is dropped when the
+        writer has fallen SEARCH_INDEX_QUEUE batches behind.
+        """
+        now = time.time()
+        rows = []
+        for result in results:
+            info_hash = result.btih()
+            if info_hash:
+                rows.append((info_hash, result.name, result.size, result.raw_size, result.seeds, result.leech,
+                             result.category, result.source, result.desc_link, result.engine_url,
+                             result.pub_date, now))
+        if not rows:
+            return
+        with self.lock:
+            # Checked on every add so a forked worker starts its own writer
+            if self.writer is None or not self.writer.is_alive():
+                self.writer = threading.Thread(target=self.write_loop, name='search-index', daemon=True)
+                self.writer.start()
+        try:
+            self.writes.put_nowait(rows)
+        except queue.Full:
+            self.dropped += len(rows)
+
+    def write_loop(self):
+        while True:
+            rows = self.writes.get()
+            batches = 1
+            # Fold whatever else is queued into the same transaction
+            while len(rows) < self.BATCH_SIZE:
+                try:
+                    rows.extend(self.writes.get_nowait())
+                except queue.Empty:
+                    break
+                batches += 1
+            self.upsert(rows)
+            for _ in range(batches):
+                self.writes.task_done()
+
+    def flush(self, timeout=5):
+        """Wait up to timeout seconds for queued results to be written"""
+        deadline = time.monotonic() + timeout
+        while self.writes.unfinished_tasks and self.writer is not None and self.writer.is_alive():
+            if time.monotonic() >= deadline:
+                logger.warning(f"Search index flush timed out with {self.writes.qsize()} batches queued")
+                return
+            time.sleep(0.05)
+
+    def upsert(self, rows):
+        """Insert or refresh rows of COLUMNS values in one transaction"""
+        try:
+            conn = self.connect()
+            with conn:
+                conn.executemany(self.UPSERT, rows)
+            self.stores += len(rows)
+            if time.monotonic() >= self.next_prune:
+                self.prune(conn)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Search index store failed: {str(e)}")
+
+    def prune(self, conn):
+        """Evict the torrents seen longest ago past max_entries, if there is a bound"""
+        self.next_prune = time.monotonic() + SEARCH_INDEX_PRUNE_INTERVAL
+        if not self.max_entries:
+            return
+        excess = conn.execute('SELECT COUNT(*) FROM torrents').fetchone()[0] - self.max_entries
+        if excess > 0:
+            with conn:
+                conn.execute('DELETE FROM torrents WHERE rowid IN '
+                             '(SELECT rowid FROM torrents ORDER BY last_seen LIMIT ?)', (excess,))
+            self.evictions += excess
+
+    def last_seen(self, info_hashes):
+        """Return {info_hash: last_seen} for those of info_hashes that are indexed"""
+        info_hashes = list(info_hashes)
+        found = {}
+        conn = self.connect()
+        # Well under SQLite's limit on bound parameters
+        for i in range(0, len(info_hashes), 500):
+            chunk = info_hashes[i:i + 500]
+            found.update(conn.execute(f"SELECT info_hash, last_seen FROM torrents WHERE info_hash IN "
+                                      f"({', '.join('?' * len(chunk))})", chunk))
+        return found
+
+    def populated(self):
+        """Whether anything has been indexed, without creating the database"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            return self.connect().execute('SELECT 1 FROM torrents LIMIT 1').fetchone() is not None
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Search index query failed: {str(e)}")
+            return False
+
+    def search(self, query, limit=None, min_seeds=0, sources=None):
+        """Return indexed TorrentResults whose names contain every word of query, best first.
+
+        sources optionally restricts results to those last seen on the named engines.
+        """
+        terms = re.findall(r'\w+', unquote(query).lower())
+        if not terms:
+            return []
+        # Quoted, each word is a plain token whatever FTS5 syntax it resembles
+        match = ' '.join(f'"{term}"' for term in terms)
+        columns = ', '.join('t.' + column for column in self.COLUMNS)
+        filters = ' AND t.seeds >= ?'
+        params = [min_seeds]
+        if sources:
+            filters += f" AND t.source IN ({', '.join('?' * len(sources))})"
+            params.extend(sources)
+        self.queries += 1
+        try:
+            conn = self.connect()
+            # Counting matches stops at the threshold, so it stays cheap
+            matches = conn.execute('SELECT COUNT(*) FROM (SELECT rowid FROM torrents_fts WHERE torrents_fts MATCH ? '
+                                   'LIMIT ?)', (match, SEARCH_INDEX_BROAD + 1)).fetchone()[0]
+            if matches > SEARCH_INDEX_BROAD:
+                # A constant rank: every match counts as equally relevant
+                rows = conn.execute(f"SELECT {columns}, -1.0 FROM torrents t INDEXED BY torrents_seeds "
+                                    "WHERE t.rowid IN (SELECT rowid FROM torrents_fts WHERE torrents_fts MATCH ?)"
+                                    f"{filters} ORDER BY t.seeds DESC LIMIT ?",
+                                    [match] + params + [2 * (limit or LOCAL_SEARCH_LIMIT)]).fetchall()
+            else:
+                rows = conn.execute(f"SELECT {columns}, torrents_fts.rank FROM torrents_fts "
+                                    "JOIN torrents t ON t.rowid = torrents_fts.rowid "
+                                    f"WHERE torrents_fts MATCH ?{filters} ORDER BY torrents_fts.rank LIMIT ?",
+                                    [match] + params + [SEARCH_INDEX_CANDIDATES]).fetchall()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Search index query failed: {str(e)}")
+            return []
+
+        now = time.time()
+
+        def score(row):
+            # bm25 ranks are negative, better matches more so
+            freshness = 0.5 ** (max(0.0, now - row[11]) / SEARCH_INDEX_HALF_LIFE)
+            return -row[12] * (1 + math.log1p(row[4]) * freshness)
+
+        return [TorrentResult(name, size, raw_size, seeds, leech, engine_url, desc_link, pub_date, category,
+                              source, info_hash=info_hash)
+                for (info_hash, name, size, raw_size, seeds, leech, category, source, desc_link, engine_url,
+                     pub_date, _, _) in heapq.nlargest(limit or LOCAL_SEARCH_LIMIT, rows, key=score)]
+
+    def stats(self):
+        return {
+            "queries": self.queries,
+            "stores": self.stores,
+            "pending_batches": self.writes.qsize(),
+            "dropped": self.dropped,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "max_entries": self.max_entries
+        }
+
+search_index = SearchIndex()
+# Unbounded: it holds a published dataset, not a cache of what was seen
+torrentscsv_index = SearchIndex(TORRENTS_CSV_INDEX_PATH, max_entries=None)
+
+metrics.gauge('cache_stat', 'Counters and sizes reported by the caches and the search index', ('cache', 'stat'),
+              collect=lambda: {(cache, stat): value
+                               for cache, stats in (('infohash', infohash_cache.stats()), ('result', result_cache.stats()),
+                                                    ('index', search_index.stats()))
+                               for stat, value in stats.items()})
+
+def cache_key(*parts):
+    """Normalize query parts so equivalent searches share a cache entry"""
+    return tuple(' '.join(str(part).lower().split()) for part in parts)
+
+async def cached_engine_search(api_id, api, query, category, limit=None, min_seeds=0, refresh=False):
+    """Run an engine search through the result cache.
+
+    Upstream requests that fail during the search (errors, timeouts, rate
+    limit give-ups, an open circuit) are collected through fetch_failures.
+    A search that found nothing because of them raises FetchError, which is
+    cached for ENGINE_ERROR_TTL; one that found nothing cleanly is cached for
+    NEGATIVE_RESULT_TTL, so a query an engine has nothing for is not sent to
+    it again on every request, and results missing some pages are kept for
+    PARTIAL_RESULT_TTL. Fresh results are also queued for the local search
+    index, and the engine's relevance profile only learns "found nothing"
+    from clean searches. With refresh the engine is searched even when a
+    cached result exists.
+    """
+    failures = []
 
-class PirateBayAPI(BaseTorrentAPI):
+    async def search():
+        # Set in the fetch's own task, and copied into the threads it uses
+        fetch_failures.set(failures)
+        with metrics.timer('engine_search_duration_seconds', api_id):
+            results = await as_async(api).search(query, category, limit, min_seeds)
+        if failures and not results:
+            raise FetchError(f"upstream requests failed: {', '.join(sorted(set(failures)))}")
+        metrics.observe('engine_results', len(results), api_id)
+        search_index.add(results)
+        # Searches cut by min_seeds say little about what the engine covers
+        if not min_seeds and (results or not failures):
+            engine_relevance.record(api_id, category, bool(results))
+        return results
+
+    def ttl(results):
+        if failures:
+            return PARTIAL_RESULT_TTL
+        return api.cache_ttl if results else NEGATIVE_RESULT_TTL
+
+    get = result_cache.refresh if refresh else result_cache.get_or_fetch
+    return await get(cache_key('engine', api_id, query, category, limit, min_seeds), search, ttl, ENGINE_ERROR_TTL)
+
+@engines.register
+class PirateBayAPI(AsyncTorrentAPI):
+    id = 'piratebay'
     url = 'https://thepiratebay.org'
+    api_url = 'https://apibay.org'
     name = 'The Pirate Bay'
     supported_categories = {
         'all': '0',
@@ -143,8 +2499,8 @@ class PirateBayAPI(BaseTorrentAPI):
         'software': '300'
     }
 
-    def search(self, what, cat='all'):
-        base_url = "https://apibay.org/q.php?%s"
+    async def search(self, what, cat='all', limit=None, min_seeds=0):
+        base_url = f"{self.api_url}/q.php?%s"
         # get response json
         what = unquote(what)
         category = self.supported_categories[cat]
@@ -152,9 +2508,10 @@ class PirateBayAPI(BaseTorrentAPI):
         if category != '0':
             params['cat'] = category
         # Calling custom `retrieve_url` function with adequate escaping
-        data = self.retrieve_url(base_url % urlencode(params))
+        data = await self.retrieve_url(base_url % urlencode(params))
         try:
-            response_json = json.loads(data)
+            with metrics.timer('parse_duration_seconds', self.id):
+                response_json = json_loads(data)
         except:
             logger.error(f"Failed to parse JSON from PirateBay API for query: {what}")
             return []
@@ -169,25 +2526,21 @@ class PirateBayAPI(BaseTorrentAPI):
             if result['info_hash'] == '0000000000000000000000000000000000000000':
                 continue
             
-            res = {
-                'link': self.download_link(result),
-                'name': result['name'],
-                'size': self.format_size(int(result['size'])),
-                'raw_size': result['size'],
-                'seeds': result['seeders'],
-                'leech': result['leechers'],
-                'engine_url': self.url,
-                'desc_link': self.url + '/description.php?id=' + result['id'],
-                'pub_date': result['added'],
-                'category': self.get_category_name(result.get('category', '0')),
-                'source': self.name
-            }
+            res = TorrentResult(
+                name=result['name'],
+                size=self.format_size(int(result['size'])),
+                raw_size=result['size'],
+                seeds=result['seeders'],
+                leech=result['leechers'],
+                engine_url=self.url,
+                desc_link=self.url + '/description.php?id=' + result['id'],
+                pub_date=result['added'],
+                category=self.get_category_name(result.get('category', '0')),
+                source=self.name,
+                info_hash=result['info_hash']
+            )
             results.append(res)
-        return results
-
-    def download_link(self, result):
-        return "magnet:?xt=urn:btih:{}&{}&{}".format(
-            result['info_hash'], urlencode({'dn': result['name']}), self.get_trackers_string())
+        return self.top_results(results, limit, min_seeds)
 
     def get_category_name(self, category_id):
         category_map = {
@@ -199,9 +2552,12 @@ class PirateBayAPI(BaseTorrentAPI):
         }
         return category_map.get(category_id, 'Other')
 
+@engines.register
 class LimeTorrentsAPI(BaseTorrentAPI):
+    id = 'limetorrents'
     url = 'https://www.limetorrents.lol'
     name = 'LimeTorrents'
+    detail_pages = True
     supported_categories = {
         'all': 'all',
         'movies': 'movies',
@@ -210,9 +2566,14 @@ class LimeTorrentsAPI(BaseTorrentAPI):
         'games': 'games',
         'software': 'applications'
     }
+    parser = RowParser(
+        r'<div class="tt-name"><a href="(?P<link>[^"]+)"[^>]*>(?P<name>.*?)</a>.*?'
+        r'<div class="tt-size"><span>(?P<size>.*?)</span></div>.*?'
+        r'<div class="ttseed">(?P<seeds>.*?)</div>.*?<div class="ttleech">(?P<leech>.*?)</div>')
 
-    def search(self, what, cat='all'):
+    def search(self, what, cat='all', limit=None, min_seeds=0):
         results = []
+        pending = []
         what = what.replace("%20", "-")
         category = self.supported_categories[cat]
         
@@ -227,56 +2588,55 @@ class LimeTorrentsAPI(BaseTorrentAPI):
                 logger.warning(f"No HTML content returned from LimeTorrents for {search_url}")
                 continue
                 
-            # Extract torrents using regex
-            pattern = r'<div class="tt-name"><a href="([^"]+)"[^>]*>(.*?)</a>.*?<div class="tt-size"><span>(.*?)</span></div>.*?<div class="ttseed">(.*?)</div>.*?<div class="ttleech">(.*?)</div>'
-            matches = re.findall(pattern, html, re.DOTALL)
-            
-            if not matches:
+            # Extract torrents using the precompiled row pattern
+            rows = self.parser.parse(html)
+            for row in rows:
+                seeds = row['seeds'].strip()
+                leech = row['leech'].strip()
+                # The info-hash is on the details page, resolved below
+                pending.append(TorrentResult(
+                    name=row['name'].strip(),
+                    size=row['size'].strip(),
+                    raw_size=self.parse_size(row['size'].strip()),
+                    seeds=int(seeds) if seeds.isdigit() else 0,
+                    leech=int(leech) if leech.isdigit() else 0,
+                    engine_url=self.url,
+                    desc_link=self.url + row['link'],
+                    pub_date=int(time.time()),  # Use current time as fallback
+                    category=category.capitalize(),
+                    source=self.name
+                ))
+                
+            if not rows.seen:
                 logger.info(f"No matches found on LimeTorrents page {page}")
                 break
                 
-            for match in matches:
-                link, name, size, seeds, leechers = match
-                
-                # Get the torrent details page to extract the hash for magnet link
-                details_url = self.url + link
-                details_html = self.retrieve_url(details_url)
-                
-                if not details_html:
-                    logger.warning(f"Couldn't get details page for {details_url}")
-                    continue
-                    
-                hash_match = re.search(r'([A-F0-9]{40})', details_html, re.IGNORECASE)
-                if not hash_match:
-                    logger.warning(f"No hash found for {details_url}")
-                    continue
-                    
-                torrent_hash = hash_match.group(1)
-                magnet_link = f"magnet:?xt=urn:btih:{torrent_hash}&{urlencode({'dn': name})}&{self.get_trackers_string()}"
-                
-                result = {
-                    'link': magnet_link,
-                    'name': name.strip(),
-                    'size': size.strip(),
-                    'raw_size': self.parse_size(size.strip()),
-                    'seeds': int(seeds.strip()) if seeds.strip().isdigit() else 0,
-                    'leech': int(leechers.strip()) if leechers.strip().isdigit() else 0,
-                    'engine_url': self.url,
-                    'desc_link': details_url,
-                    'pub_date': int(time.time()),  # Use current time as fallback
-                    'category': category.capitalize(),
-                    'source': self.name
-                }
-                
-                results.append(result)
-                
-            if len(matches) < 20:  # If less than 20 results, don't check next page
+            if rows.seen < 20:  # If less than 20 results, don't check next page
                 break
+            
+            if self.can_stop_paging(pending, limit, min_seeds):
+                break
+        
+        # Get the torrent details pages to extract the hashes for magnet links,
+        # only for results that can still make the caller's top `limit`
+        pending = self.top_results(pending, limit, min_seeds)
+        hashes = detail_resolver.resolve(self, [r.desc_link for r in pending], self.extract_hash)
+        
+        for result in pending:
+            result.info_hash = hashes.get(result.desc_link)
+            if result.info_hash:
+                results.append(result)
                 
         return results
 
+    def extract_hash(self, details_html):
+        hash_match = INFO_HASH_RE.search(details_html)
+        return hash_match.group(1) if hash_match else None
+
 # [Include all other API classes from your original code here...]
+@engines.register
 class TorLockAPI(BaseTorrentAPI):
+    id = 'torlock'
     url = 'https://www.torlock.com'
     name = 'TorLock'
     supported_categories = {
@@ -289,80 +2649,83 @@ class TorLockAPI(BaseTorrentAPI):
         'tv': 'television',
         'books': 'ebooks'
     }
+    parser = RowParser(r'<tr[^>]*>', end='</tr>', fields={
+        'torrent': r'href="/torrent/(\d+/[^"]+)"',
+        'size': r'<td>([^<]+)</td>',
+        'seeds': r'<span class="seeds">(\d+)</span>',
+        'leech': r'<span class="leeches">(\d+)</span>'
+    }, require='/torrent/')
 
-    def search(self, what, cat='all'):
+    def search(self, what, cat='all', limit=None, min_seeds=0):
         results = []
         what = what.replace("%20", "-")
         category = self.supported_categories[cat]
         
         for page in range(1, 3):  # Check first 2 pages
             search_url = f"{self.url}/{category}/torrents/{what}.html?sort=seeds&page={page}"
-            html = self.retrieve_url(search_url)
-            
-            # Extract torrents using regex
-            rows = re.findall(r'<tr[^>]*>(.*?)</tr>', html, re.DOTALL)
-            
-            for row in rows:
+            # Rows are parsed as the page downloads
+            for row in self.parser.parse(self.stream_url(search_url)):
                 try:
-                    # Skip rows that don't contain torrent data
-                    if '/torrent/' not in row:
-                        continue
-                        
                     # Extract torrent info
-                    name_match = re.search(r'href="/torrent/(\d+)/([^"]+)"', row)
-                    if not name_match:
+                    if not row['torrent']:
                         continue
                         
-                    torrent_id = name_match.group(1)
-                    name = name_match.group(2).replace('-', ' ')
+                    torrent_id, name = row['torrent'].split('/', 1)
+                    name = name.replace('-', ' ')
                     desc_link = f"{self.url}/torrent/{torrent_id}/{name}"
                     
-                    # Extract size, seeds, leechers
-                    size_match = re.search(r'<td>([^<]+)</td>', row)
-                    seeds_match = re.search(r'<span class="seeds">(\d+)</span>', row)
-                    leech_match = re.search(r'<span class="leeches">(\d+)</span>', row)
+                    size = row['size'].strip() if row['size'] else "Unknown"
+                    seeds = row['seeds'] or "0"
+                    leech = row['leech'] or "0"
                     
-                    size = size_match.group(1).strip() if size_match else "Unknown"
-                    seeds = seeds_match.group(1) if seeds_match else "0"
-                    leech = leech_match.group(1) if leech_match else "0"
-                    
-                    # For TorLock, we need to construct the download link
-                    magnet_link = f"magnet:?xt=urn:btih:{torrent_id}&{self.get_trackers_string()}&{urlencode({'dn': name})}"
-                    
-                    result = {
-                        'link': magnet_link,
-                        'name': name,
-                        'size': size,
-                        'raw_size': self.parse_size(size),
-                        'seeds': int(seeds) if seeds.isdigit() else 0,
-                        'leech': int(leech) if leech.isdigit() else 0,
-                        'engine_url': self.url,
-                        'desc_link': desc_link,
-                        'pub_date': int(time.time()),  # Current time as fallback
-                        'category': category.capitalize(),
-                        'source': self.name
-                    }
+                    # The magnet link is built from the torrent id when serialized
+                    result = TorrentResult(
+                        name=name,
+                        size=size,
+                        raw_size=self.parse_size(size),
+                        seeds=int(seeds) if seeds.isdigit() else 0,
+                        leech=int(leech) if leech.isdigit() else 0,
+                        engine_url=self.url,
+                        desc_link=desc_link,
+                        pub_date=int(time.time()),  # Current time as fallback
+                        category=category.capitalize(),
+                        source=self.name,
+                        info_hash=torrent_id
+                    )
                     
                     results.append(result)
                 except Exception as e:
                     logger.error(f"Error parsing TorLock result: {e}")
                     continue
+            
+            if self.can_stop_paging(results, limit, min_seeds):
+                break
                     
-        return results
+        return self.top_results(results, limit, min_seeds)
 
-class TorrentsCSVAPI(BaseTorrentAPI):
+@engines.register
+class TorrentsCSVAPI(AsyncTorrentAPI):
+    id = 'torrentscsv'
     url = 'https://torrents-csv.com'
     name = 'Torrents CSV'
+    cache_ttl = 900  # Dataset is refreshed in bulk, not per upload
     supported_categories = {'all': ''}
+    # Columns of the published dump that are imported, by header name
+    DUMP_COLUMNS = ('infohash', 'name', 'size_bytes', 'created_unix', 'seeders', 'leechers', 'scraped_date')
 
-    def search(self, what, cat='all'):
+    async def search(self, what, cat='all', limit=None, min_seeds=0):
+        if self.searches_dump():
+            # No network: the imported dump answers in milliseconds
+            return await asyncio.get_running_loop().run_in_executor(
+                lookup_executor, self.search_dump, what, limit, min_seeds)
         search_url = f"{self.url}/service/search?size=100&q={what}"
         desc_url = f"{self.url}/#/search/torrent/{what}/1"
 
         # get response json
-        response = self.retrieve_url(search_url)
+        response = await self.retrieve_url(search_url)
         try:
-            response_json = json.loads(response)
+            with metrics.timer('parse_duration_seconds', self.id):
+                response_json = json_loads(response)
         except:
             logger.error(f"Failed to parse JSON from TorrentsCSV for query: {what}")
             return []
@@ -370,153 +2733,221 @@ class TorrentsCSVAPI(BaseTorrentAPI):
         # parse results
         results = []
         for result in response_json.get("torrents", []):
-            res = {
-                'link': self.download_link(result),
-                'name': result['name'],
-                'size': self.format_size(int(result.get('size_bytes', 0))),
-                'raw_size': result.get('size_bytes', 0),
-                'seeds': result.get('seeders', 0),
-                'leech': result.get('leechers', 0),
-                'engine_url': self.url,
-                'desc_link': desc_url,
-                'pub_date': result.get('created_unix', int(time.time())),
-                'category': 'Unknown',
-                'source': self.name
-            }
+            res = TorrentResult(
+                name=result['name'],
+                size=self.format_size(int(result.get('size_bytes', 0))),
+                raw_size=result.get('size_bytes', 0),
+                seeds=result.get('seeders', 0),
+                leech=result.get('leechers', 0),
+                engine_url=self.url,
+                desc_link=desc_url,
+                pub_date=result.get('created_unix', int(time.time())),
+                category='Unknown',
+                source=self.name,
+                info_hash=result['infohash']
+            )
             results.append(res)
-        return results
+        return self.top_results(results, limit, min_seeds)
+
+    def searches_dump(self):
+        if TORRENTS_CSV_MODE == 'auto':
+            return torrentscsv_index.populated()
+        return TORRENTS_CSV_MODE == 'local'
 
-    def download_link(self, result):
-        return "magnet:?xt=urn:btih:{}&{}&{}".format(
-            result['infohash'], urlencode({'dn': result['name']}), self.get_trackers_string())
+    def search_dump(self, what, limit=None, min_seeds=0):
+        # As many candidates as one page of the live service returns
+        results = torrentscsv_index.search(what, limit or 100, min_seeds)
+        return self.top_results(results, limit, min_seeds)
 
+    def import_dump(self, lines, index=None):
+        """Upsert a Torrents-CSV dump into the dump index.
+
+        lines is the dump's text as an iterable of lines, such as an open
+        file, read as it goes and written SearchIndex.BATCH_SIZE rows per
+        transaction, so memory stays flat however large the dump. The header
+        names the columns and ';' or ',' separates them. A torrent whose
+        scrape date is no newer than the one indexed is left alone, so
+        re-importing a later dump only writes the rows that changed. Returns
+        counts of rows read, imported, unchanged and skipped as invalid.
+        """
+        index = torrentscsv_index if index is None else index
+        lines = iter(lines)
+        header = next(lines, '')
+        delimiter = ';' if header.count(';') > header.count(',') else ','
+        columns = {name.strip(): i for i, name in enumerate(next(csv.reader([header], delimiter=delimiter), []))}
+        missing = [name for name in self.DUMP_COLUMNS if name not in columns]
+        if missing:
+            raise ValueError(f"dump header lacks {', '.join(missing)}")
+        positions = [columns[name] for name in self.DUMP_COLUMNS]
+        width = max(positions) + 1
+        counts = {"read": 0, "imported": 0, "unchanged": 0, "skipped": 0}
+        batch = {}
+        for row in csv.reader(lines, delimiter=delimiter):
+            counts["read"] += 1
+            try:
+                if len(row) < width:
+                    raise ValueError
+                info_hash, name, size, created, seeds, leech, scraped = (row[i] for i in positions)
+                info_hash = normalize_info_hash(info_hash.strip())
+                if not info_hash or not name:
+                    raise ValueError
+                size, created, seeds, leech = int(size or 0), int(created or 0), int(seeds or 0), int(leech or 0)
+                scraped = int(scraped or 0) or created
+            except ValueError:
+                counts["skipped"] += 1
+                continue
+            batch[info_hash] = (info_hash, name, self.format_size(size), size, seeds, leech, 'Unknown', self.name,
+                                f"{self.url}/#/search/torrent/{quote(name)}/1", self.url, created, scraped)
+            if len(batch) >= SearchIndex.BATCH_SIZE:
+                self.import_batch(index, batch, counts)
+                batch = {}
+        if batch:
+            self.import_batch(index, batch, counts)
+        return counts
+
+    def import_batch(self, index, batch, counts):
+        known = index.last_seen(batch)
+        rows = [row for info_hash, row in batch.items() if row[11] > known.get(info_hash, -1)]
+        counts["unchanged"] += len(batch) - len(rows)
+        if rows:
+            index.upsert(rows)
+            counts["imported"] += len(rows)
+
+@engines.register
 class EZTVAPI(BaseTorrentAPI):
+    id = 'eztv'
     url = 'https://eztvx.to'
     name = 'EZTV'
+    cache_ttl = 120  # New episodes show up within minutes
     supported_categories = {'all': 'all', 'tv': 'tv'}
+    parser = RowParser(r"<tr class='gac_bb'>", end='</tr>', fields={
+        'name': r'class="epinfo"[^>]*title="([^"]+)"',
+        'link': r'class="magnet"[^>]*href="([^"]+)"',
+        'size': r'(\d+\.\d+\s+[KMG]B)',
+        'seeds': r'<td class="[^"]*">(\d+)</td>',
+        'age': r'>(\d+h\s+\d+m)<'
+    })
 
-    def search(self, what, cat='all'):
+    def search(self, what, cat='all', limit=None, min_seeds=0):
         what = what.replace('%20', '-')
         search_url = f"{self.url}/search/{what}"
-        html = self.retrieve_url(search_url, b"layout=def_wlinks")
-        
         results = []
         
-        # Extract results using regex
-        rows = re.findall(r'<tr class=\'gac_bb\'>(.*?)</tr>', html, re.DOTALL)
-        
-        for row in rows:
+        # Rows are parsed as the page downloads
+        for row in self.parser.parse(self.stream_url(search_url, b"layout=def_wlinks")):
             try:
-                name_match = re.search(r'class="epinfo"[^>]*title="([^"]+)"', row)
-                link_match = re.search(r'class="magnet"[^>]*href="([^"]+)"', row)
-                size_match = re.search(r'(\d+\.\d+\s+[KMG]B)', row)
-                seeds_match = re.search(r'<td class="[^"]*">(\d+)</td>', row)
-                
-                if not (name_match and link_match):
+                if not (row['name'] and row['link']):
                     continue
                     
-                name = name_match.group(1).split(' (')[0]
-                link = link_match.group(1)
-                size = size_match.group(1) if size_match else "Unknown"
-                seeds = seeds_match.group(1) if seeds_match else "0"
+                name = row['name'].split(' (')[0]
+                link = row['link']
+                size = row['size'] or "Unknown"
+                seeds = row['seeds'] or "0"
                 
                 # Parse date
-                date_match = re.search(r'(\d+)h\s+(\d+)m', row)
                 pub_date = int(time.time())
-                if date_match:
-                    hours, minutes = int(date_match.group(1)), int(date_match.group(2))
+                if row['age']:
+                    hours, minutes = (int(part) for part in row['age'][:-1].split('h'))
                     pub_date = int(time.time()) - (hours * 3600 + minutes * 60)
                 
-                result = {
-                    'link': link,
-                    'name': name,
-                    'size': size,
-                    'raw_size': self.parse_size(size),
-                    'seeds': int(seeds) if seeds.isdigit() else 0,
-                    'leech': 0,  # EZTV doesn't show leechers
-                    'engine_url': self.url,
-                    'desc_link': f"{self.url}/ep/{name.replace(' ', '-')}",
-                    'pub_date': pub_date,
-                    'category': 'TV Shows',
-                    'source': self.name
-                }
+                result = TorrentResult(
+                    link=link,
+                    name=name,
+                    size=size,
+                    raw_size=self.parse_size(size),
+                    seeds=int(seeds) if seeds.isdigit() else 0,
+                    leech=0,  # EZTV doesn't show leechers
+                    engine_url=self.url,
+                    desc_link=f"{self.url}/ep/{name.replace(' ', '-')}",
+                    pub_date=pub_date,
+                    category='TV Shows',
+                    source=self.name
+                )
                 
                 results.append(result)
             except Exception as e:
                 logger.error(f"Error parsing EZTV result: {e}")
                 continue
                 
-        return results
+        return self.top_results(results, limit, min_seeds)
 
+@engines.register
 class TorrentProjectAPI(BaseTorrentAPI):
+    id = 'torrentproject'
     url = 'https://torrentproject.cc'
     name = 'TorrentProject'
+    detail_pages = True
     supported_categories = {'all': '0'}
+    parser = RowParser(r"<tr class='gac_bb'>", end='</tr>', fields={
+        'name': r'title="([^"]+)"',
+        'desc_link': r'href="([^"]+)"',
+        'size': r'<td>([^<]+)</td>',
+        'seeds': r'style="color: green;">(\d+)</span>',
+        'leech': r'style="color: red;">(\d+)</span>'
+    })
 
-    def search(self, what, cat='all'):
+    def search(self, what, cat='all', limit=None, min_seeds=0):
         results = []
+        pending = []
         
         for page in range(0, 3):  # Check first 3 pages
             url = f"{self.url}/browse?t={what}&p={page}"
-            html = self.retrieve_url(url)
-            
-            # Parse search results
-            rows = re.findall(r'<tr class=\'gac_bb\'>(.*?)</tr>', html, re.DOTALL)
+            # Rows are parsed as the page downloads
+            rows = self.parser.parse(self.stream_url(url))
             
             for row in rows:
                 try:
-                    name_match = re.search(r'title="([^"]+)"', row)
-                    desc_link_match = re.search(r'href="([^"]+)"', row)
-                    size_match = re.search(r'<td>([^<]+)</td>', row)
-                    seeds_match = re.search(r'style="color: green;">(\d+)</span>', row)
-                    leech_match = re.search(r'style="color: red;">(\d+)</span>', row)
-                    
-                    if not (name_match and desc_link_match):
+                    if not (row['name'] and row['desc_link']):
                         continue
                         
-                    name = name_match.group(1)
-                    desc_link = desc_link_match.group(1)
+                    name = row['name']
+                    desc_link = row['desc_link']
                     if not desc_link.startswith("http"):
                         desc_link = self.url + desc_link
                         
-                    size = size_match.group(1).strip() if size_match else "Unknown"
-                    seeds = seeds_match.group(1) if seeds_match else "0"
-                    leech = leech_match.group(1) if leech_match else "0"
-                    
-                    # We need to visit the torrent page to get the magnet link
-                    torrent_html = self.retrieve_url(desc_link)
-                    magnet_match = re.search(r'href="(magnet:[^"]+)"', torrent_html)
-                    
-                    if not magnet_match:
-                        continue
-                        
-                    magnet_link = magnet_match.group(1)
+                    size = row['size'].strip() if row['size'] else "Unknown"
+                    seeds = row['seeds'] or "0"
+                    leech = row['leech'] or "0"
                     
-                    result = {
-                        'link': magnet_link,
-                        'name': name,
-                        'size': size,
-                        'raw_size': self.parse_size(size),
-                        'seeds': int(seeds),
-                        'leech': int(leech),
-                        'engine_url': self.url,
-                        'desc_link': desc_link,
-                        'pub_date': int(time.time()),  # Current time as fallback
-                        'category': 'Unknown',
-                        'source': self.name
-                    }
+                    # The magnet link is on the torrent page, resolved below
+                    result = TorrentResult(
+                        name=name,
+                        size=size,
+                        raw_size=self.parse_size(size),
+                        seeds=int(seeds),
+                        leech=int(leech),
+                        engine_url=self.url,
+                        desc_link=desc_link,
+                        pub_date=int(time.time()),  # Current time as fallback
+                        category='Unknown',
+                        source=self.name
+                    )
                     
-                    results.append(result)
+                    pending.append(result)
                 except Exception as e:
                     logger.error(f"Error parsing TorrentProject result: {e}")
                     continue
                     
-            if len(rows) < 20:  # If less than 20 results, don't check next page
+            if rows.seen < 20:  # If less than 20 results, don't check next page
                 break
+        
+        # Listings are not sorted by seeds, but only the top `limit` need a magnet
+        pending = self.top_results(pending, limit, min_seeds)
+        magnets = detail_resolver.resolve(self, [r.desc_link for r in pending], self.extract_magnet)
+        for result in pending:
+            result.link = magnets.get(result.desc_link)
+            if result.link:
+                results.append(result)
                 
         return results
 
+    def extract_magnet(self, torrent_html):
+        magnet_match = MAGNET_LINK_RE.search(torrent_html)
+        return magnet_match.group(1) if magnet_match else None
+
+@engines.register
 class NyaaAPI(BaseTorrentAPI):
+    id = 'nyaa'
     url = 'https://nyaa.si'
     name = 'Nyaa.si'
     supported_categories = {
@@ -524,39 +2955,38 @@ class NyaaAPI(BaseTorrentAPI):
         'anime': '1_0',
         'software': '6_0'
     }
+    parser = RowParser(r'<tr class="default">', end='</tr>', fields={
+        'category': r'title="([^"]+)"',
+        'name': r'title="[^"]+">\s*<i class="fa fa-fw fa-[^"]+">\s*</i>\s*([^<]+)',
+        'torrent_link': r'href="(/download/[^"]+)"',
+        'magnet': r'href="(magnet:[^"]+)"',
+        'size': r'<td class="text-center">([^<]+)</td>',
+        'date': r'<td class="text-center">([^<]+)</td>\s*<td class="text-center"',
+        'seeds': r'<td class="text-center" style="color: green;">(\d+)</td>',
+        'leech': r'<td class="text-center" style="color: red;">(\d+)</td>'
+    })
 
-    def search(self, what, cat='all'):
+    def search(self, what, cat='all', limit=None, min_seeds=0):
         results = []
         category = self.supported_categories[cat]
         
         for page in range(1, 3):  # Check first 2 pages
             search_url = f"{self.url}/?f=0&c={category}&q={what}&s=seeders&o=desc&p={page}"
-            html = self.retrieve_url(search_url)
-            
-            # Extract results using regex
-            rows = re.findall(r'<tr class="default">(.*?)</tr>', html, re.DOTALL)
+            # Rows are parsed as the page downloads
+            rows = self.parser.parse(self.stream_url(search_url))
             
             for row in rows:
                 try:
-                    category_match = re.search(r'title="([^"]+)"', row)
-                    name_match = re.search(r'title="([^"]+)">\s*<i class="fa fa-fw fa-[^"]+">\s*</i>\s*([^<]+)', row)
-                    torrent_link_match = re.search(r'href="(/download/[^"]+)"', row)
-                    magnet_link_match = re.search(r'href="(magnet:[^"]+)"', row)
-                    size_match = re.search(r'<td class="text-center">([^<]+)</td>', row)
-                    date_match = re.search(r'<td class="text-center">([^<]+)</td>\s*<td class="text-center"', row)
-                    seeds_match = re.search(r'<td class="text-center" style="color: green;">(\d+)</td>', row)
-                    leech_match = re.search(r'<td class="text-center" style="color: red;">(\d+)</td>', row)
-                    
-                    if not (name_match and magnet_link_match):
+                    if not (row['name'] and row['magnet']):
                         continue
                         
-                    category = category_match.group(1) if category_match else "Unknown"
-                    name = name_match.group(2).strip()
-                    magnet_link = magnet_link_match.group(1)
-                    size = size_match.group(1).strip() if size_match else "Unknown"
-                    date_str = date_match.group(1).strip() if date_match else ""
-                    seeds = seeds_match.group(1) if seeds_match else "0"
-                    leech = leech_match.group(1) if leech_match else "0"
+                    row_category = row['category'] or "Unknown"
+                    name = row['name'].strip()
+                    magnet_link = row['magnet']
+                    size = row['size'].strip() if row['size'] else "Unknown"
+                    date_str = row['date'].strip() if row['date'] else ""
+                    seeds = row['seeds'] or "0"
+                    leech = row['leech'] or "0"
                     
                     # Convert date to timestamp
                     pub_date = int(time.time())
@@ -567,33 +2997,39 @@ class NyaaAPI(BaseTorrentAPI):
                         except:
                             pass
                     
-                    result = {
-                        'link': magnet_link,
-                        'name': name,
-                        'size': size,
-                        'raw_size': self.parse_size(size),
-                        'seeds': int(seeds),
-                        'leech': int(leech),
-                        'engine_url': self.url,
-                        'desc_link': f"{self.url}/view{torrent_link_match.group(1).replace('/download', '')}",
-                        'pub_date': pub_date,
-                        'category': category,
-                        'source': self.name
-                    }
+                    result = TorrentResult(
+                        link=magnet_link,
+                        name=name,
+                        size=size,
+                        raw_size=self.parse_size(size),
+                        seeds=int(seeds),
+                        leech=int(leech),
+                        engine_url=self.url,
+                        desc_link=f"{self.url}/view{row['torrent_link'].replace('/download', '')}",
+                        pub_date=pub_date,
+                        category=row_category,
+                        source=self.name
+                    )
                     
                     results.append(result)
                 except Exception as e:
                     logger.error(f"Error parsing Nyaa result: {e}")
                     continue
                     
-            if len(rows) < 75:  # If less than 75 results, don't check next page
+            if rows.seen < 75:  # If less than 75 results, don't check next page
+                break
+            
+            if self.can_stop_paging(results, limit, min_seeds):
                 break
                 
-        return results
+        return self.top_results(results, limit, min_seeds)
 
+@engines.register
 class X1337API(BaseTorrentAPI):
+    id = '1337x'
     url = 'https://1337x.to'
     name = '1337x'
+    detail_pages = True
     supported_categories = {
         'all': 'All',
         'movies': 'Movies',
@@ -603,9 +3039,16 @@ class X1337API(BaseTorrentAPI):
         'anime': 'Anime',
         'software': 'Apps'
     }
+    parser = RowParser(r'<tr>', end='</tr>', fields={
+        'torrent_link': r'href="(/torrent/\d+/[^/]+/)">',
+        'size': r'<td class="size">([^<]+)</td>',
+        'seeds': r'<td class="seeds">(\d+)</td>',
+        'leech': r'<td class="leeches">(\d+)</td>'
+    }, require='href="/torrent/')
 
-    def search(self, what, cat='all'):
+    def search(self, what, cat='all', limit=None, min_seeds=0):
         results = []
+        pending = []
         cat = cat.lower()
 
         # decide which type of search to perform based on category
@@ -618,73 +3061,72 @@ class X1337API(BaseTorrentAPI):
             if cat != 'all':
                 search_url = f"{self.url}/{search_page}/{what}/{self.supported_categories[cat]}/{page}/"
                 
-            html = self.retrieve_url(search_url)
-            
-            # Parse search results
-            rows = re.findall(r'<tr>(.*?)</tr>', html, re.DOTALL)
+            # Rows are parsed as the page downloads
+            rows = self.parser.parse(self.stream_url(search_url))
             
             for row in rows:
                 try:
-                    # Check if this is actually a result row
-                    if 'href="/torrent/' not in row:
-                        continue
-                        
-                    name_match = re.search(r'href="/torrent/\d+/([^/]+)/">', row)
-                    if not name_match:
+                    if not row['torrent_link']:
                         continue
                         
-                    name = name_match.group(1).replace('-', ' ')
-                    torrent_link_match = re.search(r'href="(/torrent/\d+/[^/]+/)"', row)
-                    desc_link = self.url + torrent_link_match.group(1)
+                    name = row['torrent_link'].split('/')[3].replace('-', ' ')
+                    desc_link = self.url + row['torrent_link']
                     
-                    # Extract size, seeds, leechers
-                    size_match = re.search(r'<td class="size">([^<]+)</td>', row)
-                    seeds_match = re.search(r'<td class="seeds">(\d+)</td>', row)
-                    leech_match = re.search(r'<td class="leeches">(\d+)</td>', row)
+                    size = row['size'].strip() if row['size'] else "Unknown"
+                    seeds = row['seeds'] or "0"
+                    leech = row['leech'] or "0"
                     
-                    size = size_match.group(1).strip() if size_match else "Unknown"
-                    seeds = seeds_match.group(1) if seeds_match else "0"
-                    leech = leech_match.group(1) if leech_match else "0"
+                    # The magnet link is on the torrent page, resolved below
+                    result = TorrentResult(
+                        name=name,
+                        size=size,
+                        raw_size=self.parse_size(size),
+                        seeds=int(seeds),
+                        leech=int(leech),
+                        engine_url=self.url,
+                        desc_link=desc_link,
+                        pub_date=int(time.time()),  # Current time as fallback
+                        category=self.supported_categories.get(cat, 'Unknown'),
+                        source=self.name
+                    )
                     
-                    # We need to visit the torrent page to get the magnet link
-                    torrent_html = self.retrieve_url(desc_link)
-                    magnet_match = re.search(r'href="(magnet:[^"]+)"', torrent_html)
-                    
-                    if not magnet_match:
-                        continue
-                        
-                    magnet_link = magnet_match.group(1)
-                    
-                    result = {
-                        'link': magnet_link,
-                        'name': name,
-                        'size': size,
-                        'raw_size': self.parse_size(size),
-                        'seeds': int(seeds),
-                        'leech': int(leech),
-                        'engine_url': self.url,
-                        'desc_link': desc_link,
-                        'pub_date': int(time.time()),  # Current time as fallback
-                        'category': self.supported_categories.get(cat, 'Unknown'),
-                        'source': self.name
-                    }
-                    
-                    results.append(result)
+                    pending.append(result)
                 except Exception as e:
                     logger.error(f"Error parsing 1337x result: {e}")
                     continue
                     
-            if len(rows) < 20:  # If less than 20 results, don't check next page
+            if rows.seen < 20:  # If less than 20 results, don't check next page
                 break
+        
+        # Listings are not sorted by seeds, but only the top `limit` need a magnet
+        pending = self.top_results(pending, limit, min_seeds)
+        magnets = detail_resolver.resolve(self, [r.desc_link for r in pending], self.extract_magnet)
+        for result in pending:
+            result.link = magnets.get(result.desc_link)
+            if result.link:
+                results.append(result)
                 
         return results
 
+    def extract_magnet(self, torrent_html):
+        magnet_match = MAGNET_LINK_RE.search(torrent_html)
+        return magnet_match.group(1) if magnet_match else None
+
+@engines.register
 class MagnetDLAPI(BaseTorrentAPI):
+    id = 'magnetdl'
     url = 'http://www.magnetdl.com'
     name = 'MagnetDL'
     supported_categories = {'all': ''}
+    parser = RowParser(r'<tr>', end='</tr>', fields={
+        'magnet': r'href="(magnet:\?[^"]+)"',
+        'name': r'href="[^"]+">([^<]+)</a>',
+        'size': r'<td class="s">([^<]+)</td>',
+        'seeds': r'<td class="s">(\d+)</td>',
+        'leech': r'<td class="l">(\d+)</td>'
+    }, require='magnet:?')
 
-    def search(self, what, cat='all'):
+    def search(self, what, cat='all', limit=None, min_seeds=0):
         results = []
         what = what.lower().replace("%20", "-")
         
@@ -693,57 +3135,47 @@ class MagnetDLAPI(BaseTorrentAPI):
         
         for page in range(1, 3):  # Check first 2 pages
             search_url = f"{self.url}/{first_letter}/{what}/{page}/"
-            html = self.retrieve_url(search_url)
-            
-            # Parse search results
-            rows = re.findall(r'<tr>(.*?)</tr>', html, re.DOTALL)
+            # Rows are parsed as the page downloads
+            rows = self.parser.parse(self.stream_url(search_url))
             
             for row in rows:
                 try:
-                    # Check if this is actually a result row with magnet link
-                    if 'magnet:?' not in row:
-                        continue
-                        
-                    magnet_match = re.search(r'href="(magnet:\?[^"]+)"', row)
-                    name_match = re.search(r'href="[^"]+">([^<]+)</a>', row)
-                    size_match = re.search(r'<td class="s">([^<]+)</td>', row)
-                    seeds_match = re.search(r'<td class="s">(\d+)</td>', row, re.DOTALL)
-                    leech_match = re.search(r'<td class="l">(\d+)</td>', row)
-                    
-                    if not (magnet_match and name_match):
+                    if not (row['magnet'] and row['name']):
                         continue
                         
-                    magnet_link = magnet_match.group(1)
-                    name = name_match.group(1).strip()
-                    size = size_match.group(1) if size_match else "Unknown"
-                    seeds = seeds_match.group(1) if seeds_match else "0"
-                    leech = leech_match.group(1) if leech_match else "0"
+                    magnet_link = row['magnet']
+                    name = row['name'].strip()
+                    size = row['size'] or "Unknown"
+                    seeds = row['seeds'] or "0"
+                    leech = row['leech'] or "0"
                     
-                    result = {
-                        'link': magnet_link,
-                        'name': name,
-                        'size': size,
-                        'raw_size': self.parse_size(size),
-                        'seeds': int(seeds) if seeds.isdigit() else 0,
-                        'leech': int(leech) if leech.isdigit() else 0,
-                        'engine_url': self.url,
-                        'desc_link': self.url,
-                        'pub_date': int(time.time()),  # Current time as fallback
-                        'category': 'Unknown',
-                        'source': self.name
-                    }
+                    result = TorrentResult(
+                        link=magnet_link,
+                        name=name,
+                        size=size,
+                        raw_size=self.parse_size(size),
+                        seeds=int(seeds) if seeds.isdigit() else 0,
+                        leech=int(leech) if leech.isdigit() else 0,
+                        engine_url=self.url,
+                        desc_link=self.url,
+                        pub_date=int(time.time()),  # Current time as fallback
+                        category='Unknown',
+                        source=self.name
+                    )
                     
                     results.append(result)
                 except Exception as e:
                     logger.error(f"Error parsing MagnetDL result: {e}")
                     continue
                     
-            if len(rows) < 20:  # If less than 20 results, don't check next page
+            if rows.seen < 20:  # If less than 20 results, don't check next page
                 break
                 
-        return results
+        return self.top_results(results, limit, min_seeds)
 
+@engines.register
 class GloTorrentsAPI(BaseTorrentAPI):
+    id = 'glotorrents'
     url = 'https://glodls.to'
     name = 'GloTorrents'
     supported_categories = {
@@ -755,199 +3187,866 @@ class GloTorrentsAPI(BaseTorrentAPI):
         'anime': '28',
         'software': '18'
     }
+    parser = RowParser(r"<tr class='t-row'>", end='</tr>', fields={
+        'name': r'title="([^"]+)"',
+        'desc_link': r'href="(/.*?)"',
+        'magnet': r'href="(magnet:[^"]+)"',
+        'size': r'>([0-9\.\,]+ (?:TB|GB|MB|KB))<',
+        'seeds': r"<font color='green'><b>(\d+)</b>",
+        'leech': r"<font color='#[0-9a-zA-Z]{6}'><b>(\d+)</b>"
+    })
 
-    def search(self, what, cat='all'):
+    def search(self, what, cat='all', limit=None, min_seeds=0):
         results = []
         category = self.supported_categories[cat]
         
         for page in range(1, 3):  # Check first 2 pages
             search_url = f"{self.url}/search_results.php?search={what}&cat={category}&order=seeders&by=DESC&page={page}"
-            html = self.retrieve_url(search_url)
-            
-            # Extract torrent rows
-            rows = re.findall(r'<tr class=\'t-row\'>(.*?)</tr>', html, re.DOTALL)
+            # Rows are parsed as the page downloads
+            rows = self.parser.parse(self.stream_url(search_url))
             
             for row in rows:
                 try:
-                    # Extract torrent info
-                    name_match = re.search(r'title="([^"]+)"', row)
-                    if not name_match:
-                        continue
-                        
-                    name = name_match.group(1)
-                    desc_link_match = re.search(r'href="(/.*?)"', row)
-                    desc_link = self.url + desc_link_match.group(1) if desc_link_match else self.url
-                    
-                    # Extract magnet link
-                    magnet_match = re.search(r'href="(magnet:[^"]+)"', row)
-                    if not magnet_match:
+                    if not (row['name'] and row['magnet']):
                         continue
                         
-                    magnet_link = magnet_match.group(1)
-                    
-                    # Extract size, seeds, leechers
-                    size_match = re.search(r'([0-9\.\,]+ (TB|GB|MB|KB))', row)
-                    seeds_match = re.search(r'<font color=\'green\'><b>(\d+)</b>', row)
-                    leech_match = re.search(r'<font color=\'#[0-9a-zA-Z]{6}\'><b>(\d+)</b>', row)
-                    
-                    size = size_match.group(1) if size_match else "Unknown"
-                    seeds = seeds_match.group(1) if seeds_match else "0"
-                    leech = leech_match.group(1) if leech_match else "0"
+                    name = row['name']
+                    desc_link = self.url + row['desc_link'] if row['desc_link'] else self.url
+                    magnet_link = row['magnet']
+                    size = row['size'] or "Unknown"
+                    seeds = row['seeds'] or "0"
+                    leech = row['leech'] or "0"
                     
-                    result = {
-                        'link': magnet_link,
-                        'name': name,
-                        'size': size,
-                        'raw_size': self.parse_size(size),
-                        'seeds': int(seeds) if seeds.isdigit() else 0,
-                        'leech': int(leech) if leech.isdigit() else 0,
-                        'engine_url': self.url,
-                        'desc_link': desc_link,
-                        'pub_date': int(time.time()),  # Current time as fallback
-                        'category': cat.capitalize(),
-                        'source': self.name
-                    }
+                    result = TorrentResult(
+                        link=magnet_link,
+                        name=name,
+                        size=size,
+                        raw_size=self.parse_size(size),
+                        seeds=int(seeds) if seeds.isdigit() else 0,
+                        leech=int(leech) if leech.isdigit() else 0,
+                        engine_url=self.url,
+                        desc_link=desc_link,
+                        pub_date=int(time.time()),  # Current time as fallback
+                        category=cat.capitalize(),
+                        source=self.name
+                    )
                     
                     results.append(result)
                 except Exception as e:
                     logger.error(f"Error parsing GloTorrents result: {e}")
                     continue
                     
-            if len(rows) < 20:  # If less than 20 results, don't check next page
+            if rows.seen < 20:  # If less than 20 results, don't check next page
+                break
+            
+            if self.can_stop_paging(results, limit, min_seeds):
                 break
                 
-        return results
+        return self.top_results(results, limit, min_seeds)
+
+@app.after_request
+def compress_response(response):
+    """Compress text responses with brotli or gzip when the client accepts it.
+
+    Streamed responses are left alone so their frames are not held back, as
+    are static files and bodies too small to be worth it.
+    """
+    if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+            or not response.mimetype.startswith(COMPRESSIBLE_TYPES)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+    data = response.get_data()
+    if not encoding or len(data) < COMPRESS_MIN_SIZE:
+        return response
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The compressed body is another representation, no longer byte-identical
+        response.set_etag(etag, weak=True)
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    return response
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/search')
-def search():
-    query = request.args.get('q', '')
-    category = request.args.get('category', 'all')
-    site = request.args.get('site', 'all')
-    
-    if not query:
-        return jsonify([])
-    
-    results = []
-    errors = []
-    
+class ResultMerger:
+    """Merge results from all engines that share a btih info-hash.
+
+    Results are indexed by info-hash, so merging is linear in their number.
+    A merged record keeps the fields of the first copy seen, the highest seed
+    and leech counts any engine reported (they scrape different trackers, so
+    counts overlap rather than add up) and the names of every engine that
+    returned it in sources. Results that are themselves merged records bring
+    all their sources along. Results without a recognizable hash are kept
+    unmerged. Records are copies; cached engine results are never modified.
+    """
+    def __init__(self):
+        self.by_hash = {}
+        self.results = []
+
+    def add(self, results):
+        """Merge results in and return (new records, updated records)"""
+        new = []
+        new_hashes = set()
+        updated = {}
+        for result in results:
+            info_hash = result.btih()
+            record = self.by_hash.get(info_hash) if info_hash else None
+            if record is None:
+                record = result.copy()
+                record.sources = list(result.sources or [result.source])
+                if info_hash:
+                    self.by_hash[info_hash] = record
+                    new_hashes.add(info_hash)
+                self.results.append(record)
+                new.append(record)
+                continue
+            record.seeds = max(record.seeds, result.seeds)
+            record.leech = max(record.leech, result.leech)
+            for source in result.sources or [result.source]:
+                if source not in record.sources:
+                    record.sources.append(source)
+            if info_hash not in new_hashes:
+                updated[info_hash] = record
+        return new, list(updated.values())
+
+async def iter_fan_out(apis, query, category, deadline=SEARCH_DEADLINE, engine_deadline=ENGINE_DEADLINE,
+                       limit=None, min_seeds=0, refresh=False):
+    """Run every engine's search concurrently, yielding each as it finishes.
+
+    Yields (api_id, status, results) in completion order, where status is a
+    block of 'ok', 'timeout', 'error' or 'skipped' with the result count and
+    elapsed seconds. Engines still running at their deadline are yielded as
+    timeouts. Engines whose circuit is open are skipped up front. When
+    several engines are searched, so are those engine_relevance deems
+    irrelevant to the category. A skipped block gives the reason, one of
+    EngineRelevance.REASONS. If every engine would be skipped as merely
+    unlikely, they are all searched instead.
+
+    limit and min_seeds are passed to every engine, which then returns at
+    most its own best `limit` results with at least min_seeds seeders.
+    refresh bypasses the cached engine results.
+    """
+    start = time.monotonic()
+    request_deadline = start + deadline
+    # Engine tasks inherit the flow, sharing each host fairly with other
+    # searches; a caller that already set one (a batch) keeps it
+    if search_flow.get() is None:
+        search_flow.set(next(search_flows))
+    skipped = {}  # api_id -> reason
+    for api_id, api in apis.items():
+        if not engine_health.available(api_id):
+            skipped[api_id] = 'circuit_open'
+        elif len(apis) > 1:
+            reason = engine_relevance.skip_reason(api, category)
+            if reason:
+                skipped[api_id] = reason
+    if len(skipped) == len(apis):
+        skipped = {api_id: reason for api_id, reason in skipped.items() if reason != 'unlikely'}
+
+    tasks = {}
+    for api_id, api in apis.items():
+        if api_id in skipped:
+            if skipped[api_id] == 'unlikely' and engine_relevance.probe_due(api_id, category):
+                engine_relevance.probe(api_id, api, query, category, limit, min_seeds)
+            continue
+        task = asyncio.ensure_future(cached_engine_search(api_id, api, query, category, limit, min_seeds, refresh))
+        tasks[task] = (api_id, min(start + engine_deadline, request_deadline))
+
+    for api_id, reason in skipped.items():
+        logger.info(f"Skipping {api_id}: {EngineRelevance.REASONS[reason]}")
+        metrics.inc('engine_searches_total', api_id, 'skipped')
+        yield api_id, {"status": "skipped", "reason": reason, "count": 0, "elapsed": 0.0}, []
+
+    pending = set(tasks)
     try:
-        # Create instances of the torrent site APIs
-        apis = {
-            'piratebay': PirateBayAPI(),
-            'limetorrents': LimeTorrentsAPI(),
-            'torlock': TorLockAPI(),
-            'torrentscsv': TorrentsCSVAPI(),
-            'eztv': EZTVAPI(),
-            'torrentproject': TorrentProjectAPI(),
-            'nyaa': NyaaAPI(),
-            '1337x': X1337API(),
-            'magnetdl': MagnetDLAPI(),
-            'glotorrents': GloTorrentsAPI()
-        }
-        
-        logger.info(f"Search request: query='{query}', category='{category}', site='{site}'")
-        
-        # Search all sites or just the requested one
-        if site == 'all':
-            for api_name, api in apis.items():
+        while pending:
+            next_deadline = min(tasks[task][1] for task in pending)
+            done, pending = await asyncio.wait(pending, timeout=max(0, next_deadline - time.monotonic()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            now = time.monotonic()
+            elapsed = round(now - start, 3)
+
+            for task in done:
+                api_id = tasks[task][0]
                 try:
-                    logger.info(f"Searching {api_name}...")
-                    site_results = api.search(query, category)
-                    logger.info(f"Found {len(site_results)} results from {api_name}")
-                    results.extend(site_results)
+                    site_results = task.result()
                 except Exception as e:
-                    error_msg = f"Error searching {api_name}: {str(e)}"
-                    logger.error(error_msg)
-                    errors.append(error_msg)
-        elif site in apis:
-            try:
-                results = apis[site].search(query, category)
-                logger.info(f"Found {len(results)} results from {site}")
-            except Exception as e:
-                error_msg = f"Error searching {site}: {str(e)}"
-                logger.error(error_msg)
-                errors.append(error_msg)
+                    logger.error(f"Error searching {api_id}: {str(e)}")
+                    metrics.inc('engine_searches_total', api_id, 'error')
+                    yield api_id, {"status": "error", "error": str(e), "count": 0, "elapsed": elapsed}, []
+                    continue
+                logger.info(f"Found {len(site_results)} results from {api_id} in {elapsed}s")
+                metrics.inc('engine_searches_total', api_id, 'ok')
+                yield api_id, {"status": "ok", "count": len(site_results), "elapsed": elapsed}, site_results
+
+            # Stop waiting for engines that have run past their deadline; the
+            # shared fetch finishes in the background and still fills the cache.
+            for task in list(pending):
+                api_id, engine_deadline_at = tasks[task]
+                if now >= engine_deadline_at:
+                    pending.discard(task)
+                    task.cancel()
+                    logger.warning(f"Search on {api_id} timed out after {elapsed}s")
+                    metrics.inc('engine_searches_total', api_id, 'timeout')
+                    yield api_id, {"status": "timeout", "count": 0, "elapsed": elapsed}, []
+    finally:
+        # The consumer may stop early (e.g. a streaming client went away)
+        for task in pending:
+            task.cancel()
+
+async def fan_out_search(apis, query, category, deadline=SEARCH_DEADLINE, engine_deadline=ENGINE_DEADLINE,
+                         limit=None, min_seeds=0, refresh=False):
+    """Run every engine's search concurrently and collect what finishes in time.
+
+    Returns (results, sites) where sites maps each engine id to its status
+    block from iter_fan_out.
+    """
+    results = []
+    sites = {api_id: None for api_id in apis}
+    async for api_id, status, site_results in iter_fan_out(apis, query, category, deadline, engine_deadline,
+                                                           limit, min_seeds, refresh):
+        sites[api_id] = status
+        results.extend(site_results)
+    return results, sites
+
+async def search_sites(apis, query, category, site, limit=None, min_seeds=0, refresh=False):
+    """Search the given engines through the response cache, sorted by seeders.
+
+    With refresh every engine is searched again and the cached response replaced.
+    """
+    async def fetch():
+        results, sites = await fan_out_search(apis, query, category, limit=limit, min_seeds=min_seeds,
+                                              refresh=refresh)
+        
+        # Collapse the same torrent found by several engines into one record
+        merger = ResultMerger()
+        merger.add(results)
         
         # Sort results by seeders (descending)
-        results = sorted(results, key=lambda x: int(x.get('seeds', 0)), reverse=True)
+        results = sorted(merger.results, key=lambda x: x.seeds, reverse=True)
+        if limit:
+            results = results[:limit]
         
         logger.info(f"Total results: {len(results)}")
-        if errors:
-            logger.warning(f"Errors encountered: {len(errors)}")
-            
-        return jsonify(results)
+        failed = [api_id for api_id, status in sites.items() if missing(status)]
+        if failed:
+            logger.warning(f"Sites without results: {', '.join(failed)}")
+        return {"results": results, "sites": sites}
+    
+    def missing(status):
+        # Engines left out as irrelevant would be left out again on a retry
+        return status["status"] != "ok" and status.get("reason") not in ('category', 'unlikely')
+    
+    def ttl(response):
+        # Keep partial responses only briefly so missing sites are retried soon
+        if any(missing(status) for status in response["sites"].values()):
+            return PARTIAL_RESULT_TTL
+        if not response["results"]:
+            return NEGATIVE_RESULT_TTL
+        return min(api.cache_ttl for api in apis.values())
+    
+    get = result_cache.refresh if refresh else result_cache.get_or_fetch
+    return await get(cache_key('search', query, category, site, limit, min_seeds), fetch, ttl)
+
+def int_arg(args, name, default=None):
+    """Read an optional integer query parameter, raising ValueError naming it if it is not one"""
+    value = args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+
+def search_limits(args):
+    """Read the optional limit and min_seeds query parameters.
+
+    Returns (limit, min_seeds), limit being None for no limit; raises
+    ValueError for values that are not integers or out of range.
+    """
+    limit = int_arg(args, 'limit')
+    min_seeds = int_arg(args, 'min_seeds', 0)
+    if limit is not None and limit < 1:
+        raise ValueError("limit must be a positive integer")
+    if min_seeds < 0:
+        raise ValueError("min_seeds must not be negative")
+    return limit, min_seeds
+
+def search_mode(args):
+    """Read the optional mode query parameter, one of SEARCH_MODES.
+
+    live searches the upstream sites, local answers from the search index
+    alone and hybrid merges the two. Raises ValueError for other values.
+    """
+    mode = args.get('mode', 'live')
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+    return mode
+
+def search_local(apis, query, limit=None, min_seeds=0, site='all'):
+    """Search the local index, returning (results, status block).
+
+    For a single site only torrents last seen on that engine are returned.
+    """
+    start = time.monotonic()
+    sources = None if site == 'all' else [api.name for api in apis.values()]
+    results = search_index.search(query, limit, min_seeds, sources) if sources != [] else []
+    return results, {"status": "ok", "count": len(results), "elapsed": round(time.monotonic() - start, 3)}
+
+def merge_local(response, local, status):
+    """Add indexed torrents the live search did not find to a search_sites response"""
+    merger = ResultMerger()
+    merger.add(response["results"])
+    merger.add(local)
+    results = sorted(merger.results, key=lambda x: x.seeds, reverse=True)
+    return {"results": results, "sites": dict(response["sites"], local=status)}
+
+def as_number(value):
+    # Engines that pass upstream values through leave sizes and dates as strings
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+SORT_KEYS = {
+    'seeds': lambda result: result.seeds,
+    'size': lambda result: as_number(result.raw_size),
+    'date': lambda result: as_number(result.pub_date),
+    'ratio': lambda result: result.seeds / max(result.leech, 1),
+}
+
+class ResultView:
+    """A sorted, filtered page of a search response, picked on the server.
+
+    Views are applied to the merged results cached for a search, so paging
+    through them, sorting them another way or narrowing them down never
+    searches upstream again. Without sort the response keeps its own order
+    (seeders for live searches, relevance for local ones). With a limit only
+    the results up to the end of the page are ranked, with a heap, instead of
+    sorting every match. total counts the matches, or is None when the
+    results were cut to a depth and more may follow, and next_offset is the
+    offset of the following page, or None after the last one.
+    """
+    def __init__(self, sort=None, order='desc', min_size=None, max_size=None, min_seeds=0, sources=None,
+                 offset=0, limit=None):
+        self.sort = sort
+        self.order = order
+        self.min_size = min_size
+        self.max_size = max_size
+        self.min_seeds = min_seeds
+        self.sources = sources
+        self.offset = offset
+        self.limit = limit
+
+    @classmethod
+    def from_args(cls, args, limit=None, min_seeds=0):
+        """Read sort, order, min_size, max_size, source and offset query parameters.
+
+        source is a comma separated list of engine ids. Raises ValueError for
+        values out of range.
+        """
+        sort = args.get('sort')
+        if sort is not None and sort not in SEARCH_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(SEARCH_SORTS)}")
+        order = args.get('order', 'desc')
+        if order not in SEARCH_ORDERS:
+            raise ValueError(f"order must be one of {', '.join(SEARCH_ORDERS)}")
+        min_size = int_arg(args, 'min_size')
+        max_size = int_arg(args, 'max_size')
+        if (min_size is not None and min_size < 0) or (max_size is not None and max_size < 0):
+            raise ValueError("min_size and max_size must not be negative")
+        offset = int_arg(args, 'offset', 0)
+        if offset < 0:
+            raise ValueError("offset must not be negative")
+        sources = None
+        if args.get('source'):
+            ids = [engine_id.strip() for engine_id in args['source'].split(',') if engine_id.strip()]
+            unknown = [engine_id for engine_id in ids if engine_id not in engines.engines]
+            if unknown:
+                raise ValueError(f"unknown source: {', '.join(unknown)}")
+            sources = {engines.engines[engine_id].name for engine_id in ids}
+        return cls(sort, order, min_size, max_size, min_seeds, sources, offset, limit)
+
+    def depth(self):
+        """Results per engine enough for this page, or None when it needs them all.
+
+        Pages ranked by seeders only need every engine's best results down to
+        their end, plus one to tell if more follow, so engines can stop paging
+        early. min_seeds keeps a prefix of that order, so it is cut the same
+        way. Other orders, and the size and source filters, which can match
+        results anywhere in it, need the whole result set.
+        """
+        if not self.limit or not (self.sort is None or (self.sort == 'seeds' and self.order == 'desc')):
+            return None
+        if self.sources is not None or self.min_size is not None or self.max_size is not None:
+            return None
+        return max(SEARCH_DEPTH, 1 << (self.offset + self.limit).bit_length())
+
+    def matches(self, result):
+        if result.seeds < self.min_seeds:
+            return False
+        if self.min_size is not None or self.max_size is not None:
+            size = as_number(result.raw_size)
+            if self.min_size is not None and size < self.min_size:
+                return False
+            if self.max_size is not None and size > self.max_size:
+                return False
+        return self.sources is None or not self.sources.isdisjoint(result.sources or [result.source])
+
+    def apply(self, results, complete=True):
+        """Return the page of results as a dict with results, total, offset and next_offset.
+
+        complete is False when results were cut to a depth, leaving total unknown.
+        """
+        filtered = (self.min_seeds or self.min_size is not None or self.max_size is not None
+                    or self.sources is not None)
+        matching = [result for result in results if self.matches(result)] if filtered else results
+        end = self.offset + self.limit if self.limit else None
+        ranked = matching
+        if self.sort:
+            key = SORT_KEYS[self.sort]
+            if end is None:
+                ranked = sorted(matching, key=key, reverse=self.order == 'desc')
+            elif self.order == 'desc':
+                ranked = heapq.nlargest(end, matching, key=key)
+            else:
+                ranked = heapq.nsmallest(end, matching, key=key)
+        return {
+            "results": ranked[self.offset:end],
+            "total": len(matching) if complete else None,
+            "offset": self.offset,
+            "next_offset": end if end is not None and end < len(matching) else None
+        }
+
+class Prefetcher:
+    """Keep the response cache warm for the most popular searches.
+
+    Every live search is counted with record(); a count's weight halves every
+    PREFETCH_HALF_LIFE seconds, so the ranking follows what is trending now.
+    Each round re-runs the top searches whose cached response would expire
+    before the next round, within PREFETCH_BUDGET. Searches seen fewer than
+    PREFETCH_MIN_WEIGHT times within about a half-life, and searches whose
+    last response found nothing, are left alone. The searches are started
+    evenly through the round and at most PREFETCH_CONCURRENCY at a time, so
+    upstream sites see a steady trickle instead of a burst. Engines with an
+    open circuit are skipped as in any other search. The loop runs on the
+    engine loop and starts with the first recorded search.
+    """
+    def __init__(self, budget=PREFETCH_BUDGET, concurrency=PREFETCH_CONCURRENCY, interval=PREFETCH_INTERVAL,
+                 min_weight=PREFETCH_MIN_WEIGHT):
+        self.budget = budget
+        self.concurrency = concurrency
+        self.interval = interval
+        self.min_weight = min_weight
+        self.counts = {}  # cache key -> [weight, search parameters]
+        self.epoch = time.monotonic()
+        self.lock = threading.Lock()
+        self.future = None
+        self.rounds = 0
+        self.prefetched = 0
+        self.errors = 0
+
+    def record(self, query, category, site, limit=None, min_seeds=0):
+        """Count one search, keyed the way search_sites caches it"""
+        if self.budget <= 0:
+            return
+        key = cache_key('search', query, category, site, limit, min_seeds)
+        with self.lock:
+            # Later searches weigh exponentially more, which decays every older
+            # count without touching it; rebased before the weights overflow
+            now = time.monotonic()
+            exponent = (now - self.epoch) / PREFETCH_HALF_LIFE
+            if exponent > 64:
+                for entry in self.counts.values():
+                    entry[0] *= 2 ** -exponent
+                self.epoch = now
+                exponent = 0
+                self.drop_unpopular(1)
+            weight = 2 ** exponent
+            entry = self.counts.get(key)
+            if entry is None:
+                self.counts[key] = [weight, (query, category, site, limit, min_seeds)]
+                if len(self.counts) > PREFETCH_TRACKED:
+                    self.forget()
+            else:
+                entry[0] += weight
+            if self.future is None or self.future.done():
+                self.future = engine_loop.submit(self.run())
+
+    def forget(self):
+        # Called with the lock held: drop what is too rare to prefetch, then
+        # keep at most the more popular half
+        self.drop_unpopular(2 ** ((time.monotonic() - self.epoch) / PREFETCH_HALF_LIFE))
+        if len(self.counts) > PREFETCH_TRACKED // 2:
+            ranked = sorted(self.counts.items(), key=lambda item: item[1][0], reverse=True)
+            self.counts = dict(ranked[:PREFETCH_TRACKED // 2])
+
+    def drop_unpopular(self, scale):
+        # Called with the lock held; scale is the weight of a search made now
+        self.counts = {key: entry for key, entry in self.counts.items() if entry[0] >= self.min_weight * scale}
+
+    def top(self, k=PREFETCH_TOP_K):
+        """The k most popular searches at or above min_weight, as [(cache key, search parameters)]"""
+        with self.lock:
+            floor = self.min_weight * 2 ** ((time.monotonic() - self.epoch) / PREFETCH_HALF_LIFE)
+            ranked = heapq.nlargest(k, ((key, entry) for key, entry in self.counts.items() if entry[0] >= floor),
+                                    key=lambda item: item[1][0])
+        return [(key, params) for key, (_, params) in ranked]
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.prefetch_round()
+            except Exception as e:
+                logger.error(f"Prefetch round failed: {str(e)}")
+            await asyncio.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+    async def prefetch_round(self):
+        self.rounds += 1
+        due = []
+        for key, params in self.top():
+            cached = result_cache.peek(key)
+            if cached is not None and not cached["results"]:
+                # Nothing to keep warm; a new search finding results refills it
+                continue
+            expires_in = result_cache.expires_in(key)
+            if shared_state.enabled and (expires_in is None or expires_in < self.interval):
+                # Another worker may have prefetched it already
+                expires_in = await asyncio.get_running_loop().run_in_executor(None, shared_state.expires_in, key)
+            if expires_in is None or expires_in < self.interval:
+                due.append(params)
+                if len(due) >= self.budget:
+                    break
+        if not due:
+            return
+        semaphore = asyncio.Semaphore(self.concurrency)
+        spacing = self.interval / len(due)
+
+        async def prefetch(delay, params):
+            await asyncio.sleep(delay)
+            async with semaphore:
+                await self.prefetch(*params)
+
+        await asyncio.gather(*(prefetch(i * spacing, params) for i, params in enumerate(due)))
+
+    async def prefetch(self, query, category, site, limit, min_seeds):
+        # Upstream requests made for a prefetch wait behind those of user searches
+        background_fetch.set(True)
+        apis = engines.select(site)
+        try:
+            await search_sites(apis, query, category, site, limit, min_seeds, refresh=True)
+        except Exception as e:
+            self.errors += 1
+            metrics.inc('prefetch_searches_total', 'error')
+            logger.error(f"Prefetch of '{query}' failed: {str(e)}")
+            return
+        self.prefetched += 1
+        metrics.inc('prefetch_searches_total', 'ok')
+
+    def stats(self):
+        return {
+            "tracked": len(self.counts),
+            "rounds": self.rounds,
+            "prefetched": self.prefetched,
+            "errors": self.errors,
+            "budget": self.budget,
+            "concurrency": self.concurrency
+        }
+
+prefetcher = Prefetcher()
+
+def search_args(args):
+    """Read the /api/search parameters from args, a request.args style MultiDict.
+
+    Returns (query, category, site, mode, limit, min_seeds, view); raises
+    ValueError for values out of range and categories the site lacks.
+    """
+    category, site = args.get('category', 'all'), args.get('site', 'all')
+    limit, min_seeds = search_limits(args)
+    mode = search_mode(args)
+    view = ResultView.from_args(args, limit, min_seeds)
+    engines.check_category(category, site)
+    return args.get('q', ''), category, site, mode, limit, min_seeds, view
+
+async def search_response(query, category, site, mode, limit, min_seeds, view):
+    """Answer one search as /api/search does; runs on the engine loop"""
+    if not query:
+        return dict(view.apply([]), sites={})
+    # Search all sites or just the requested one
+    apis = engines.select(site)
+    if mode != 'live':
+        # The index returns its best LOCAL_SEARCH_LIMIT matches; deeper pages
+        # read further, one past the page so next_offset shows if more follow
+        local_limit = max(LOCAL_SEARCH_LIMIT, view.offset + limit + 1) if limit else None
+        local, status = await asyncio.get_running_loop().run_in_executor(
+            lookup_executor, search_local, apis, query, local_limit, min_seeds, site)
+        if mode == 'local':
+            return dict(view.apply(local), sites={"local": status})
+    
+    # The merged results are fetched and cached down to the view's depth and
+    # unfiltered, so pages and filters within it are cut from one response
+    depth = view.depth()
+    prefetcher.record(query, category, site, depth)
+    response = await search_sites(apis, query, category, site, depth)
+    # Fewer results than the depth means no engine had more to give
+    complete = depth is None or len(response["results"]) < depth
+    if mode == 'hybrid':
+        response = merge_local(response, local, status)
+    return dict(view.apply(response["results"], complete), sites=response["sites"])
+
+@app.route('/api/search')
+async def search():
+    """Search the sites and return one page of the merged results.
+
+    limit and offset page through the results, sort and order rank them and
+    min_seeds, min_size, max_size and source filter them (see ResultView).
+    Pages and filters are cut from one cached merged response per depth (see
+    ResultView.depth), so paging within it or changing a filter does not
+    search upstream again.
+    """
+    try:
+        params = search_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        query, category, site = params[:3]
+        if query:
+            logger.info(f"Search request: query='{query}', category='{category}', site='{site}'")
+        # The search itself runs on the shared engine loop, where its upstream
+        # requests are multiplexed with those of every other in-flight search
+        return jsonify(await engine_loop.wait(search_response(*params)))
     except Exception as e:
         error_msg = f"Unexpected error: {str(e)}"
         logger.error(error_msg)
-        return jsonify({"error": error_msg, "site_errors": errors}), 500
+        return jsonify({"error": error_msg}), 500
+
+@app.route('/api/search/batch', methods=['POST'])
+def search_batch():
+    """Run many searches in one request, streaming each answer as it is ready.
+
+    Takes a JSON array of up to BATCH_MAX_SEARCHES items, objects with the
+    /api/search parameters (q, category, site and optionally mode, limit,
+    sort and the rest). Every item is checked before any search starts.
+    Identical items are searched once, and all the searches run concurrently
+    on the engine loop as a single flow, so at each host the batch takes
+    turns with other searches like one search would, not one per item.
+    Returns newline-delimited JSON: a 'result' frame per item, with its index
+    in the array and what /api/search would have returned, in completion
+    order ('error' instead if its search failed), then a 'summary' frame.
+    """
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        return jsonify({"error": "body must be a JSON array of searches"}), 400
+    if len(items) > BATCH_MAX_SEARCHES:
+        return jsonify({"error": f"at most {BATCH_MAX_SEARCHES} searches per batch"}), 400
+    
+    searches = {}  # normalized parameters -> (search_args result, item indexes)
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            return jsonify({"error": f"search {index}: must be an object"}), 400
+        args = MultiDict({key: str(value) for key, value in item.items() if value is not None})
+        try:
+            params = search_args(args)
+        except ValueError as e:
+            return jsonify({"error": f"search {index}: {str(e)}"}), 400
+        key = cache_key(*params[:3]) + tuple(sorted((name, value) for name, value in args.items()
+                                                     if name not in ('q', 'category', 'site')))
+        searches.setdefault(key, (params, []))[1].append(index)
+    
+    logger.info(f"Batch search request: {len(items)} searches, {len(searches)} distinct")
+    frames = queue.Queue()
+    
+    async def produce():
+        start = time.monotonic()
+        search_flow.set(next(search_flows))
+        # Tasks copy this context, flow included
+        tasks = {asyncio.ensure_future(search_response(*params)): (params[0], indexes)
+                 for params, indexes in searches.values()}
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    query, indexes = tasks[task]
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        logger.error(f"Batch search for '{query}' failed: {str(e)}")
+                        for index in indexes:
+                            frames.put({"type": "error", "index": index, "q": items[index].get('q', ''),
+                                        "error": f"Unexpected error: {str(e)}"})
+                        continue
+                    for index in indexes:
+                        frames.put(dict(response, type="result", index=index, q=items[index].get('q', '')))
+            frames.put({"type": "summary", "total": len(items), "distinct": len(searches),
+                        "elapsed": round(time.monotonic() - start, 3)})
+        finally:
+            for task in tasks:
+                task.cancel()
+            frames.put(None)
+    
+    def generate():
+        future = engine_loop.submit(produce())
+        try:
+            while True:
+                frame = frames.get()
+                if frame is None:
+                    break
+                yield json_dumps(frame) + b"\n"
+        finally:
+            # Stops the searches if the client disconnects early
+            future.cancel()
+    
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/search/stream')
+def search_stream():
+    """Stream each site's results as soon as they arrive.
+
+    Sends newline-delimited JSON frames, or Server-Sent Events when the client
+    accepts text/event-stream: one 'results' frame per site followed by a
+    final 'summary' frame with the per-site status block. Torrents already
+    sent for an earlier site are not repeated; a results frame instead lists
+    them under 'merged' with their info_hash and updated seeds, leech and
+    sources. In local and hybrid mode the first frame is site 'local', with
+    the matches from the search index.
+    """
+    query = request.args.get('q', '')
+    category = request.args.get('category', 'all')
+    site = request.args.get('site', 'all')
+    sse = 'text/event-stream' in request.headers.get('Accept', '')
+    
+    try:
+        limit, min_seeds = search_limits(request.args)
+        mode = search_mode(request.args)
+        engines.check_category(category, site)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    apis = engines.select(site) if query else {}
+    live_apis = apis if mode != 'local' else {}
+    if live_apis:
+        prefetcher.record(query, category, site, limit, min_seeds)
+    
+    logger.info(f"Stream search request: query='{query}', category='{category}', site='{site}'")
+    frames = queue.Queue()
+    
+    async def produce():
+        start = time.monotonic()
+        merger = ResultMerger()
+        sites = {api_id: None for api_id in live_apis}
+        try:
+            if mode != 'live':
+                local, status = await asyncio.get_running_loop().run_in_executor(
+                    lookup_executor, search_local, apis, query, limit, min_seeds, site)
+                sites["local"] = status
+                new, _ = merger.add(local)
+                frames.put({"type": "results", "site": "local", "status": status, "results": new, "merged": []})
+            async for api_id, status, site_results in iter_fan_out(live_apis, query, category,
+                                                                   limit=limit, min_seeds=min_seeds):
+                sites[api_id] = status
+                new, updated = merger.add(site_results)
+                frames.put({
+                    "type": "results",
+                    "site": api_id,
+                    "status": status,
+                    "results": sorted(new, key=lambda x: x.seeds, reverse=True),
+                    "merged": [{"info_hash": record.btih(), "seeds": record.seeds, "leech": record.leech,
+                                "sources": record.sources} for record in updated]
+                })
+            frames.put({"type": "summary", "total": len(merger.results), "sites": sites,
+                        "elapsed": round(time.monotonic() - start, 3)})
+        except Exception as e:
+            logger.error(f"Unexpected error while streaming: {str(e)}")
+            frames.put({"type": "error", "error": f"Unexpected error: {str(e)}"})
+        finally:
+            frames.put(None)
+    
+    def encode(frame):
+        if sse:
+            return f"event: {frame['type']}\ndata: {json_dumps(frame).decode()}\n\n"
+        return json_dumps(frame).decode() + "\n"
+    
+    def generate():
+        future = engine_loop.submit(produce())
+        try:
+            while True:
+                frame = frames.get()
+                if frame is None:
+                    break
+                yield encode(frame)
+        finally:
+            # Stops waiting on engines if the client disconnects early
+            future.cancel()
+    
+    mimetype = 'text/event-stream' if sse else 'application/x-ndjson'
+    return Response(generate(), mimetype=mimetype,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def listing_response(name):
+    """Serve a registry listing with an ETag, answering a matching If-None-Match with 304"""
+    body, etag = engines.listing(name)
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = LISTING_MAX_AGE
+    return response.make_conditional(request)
 
 @app.route('/api/sites')
 def get_sites():
-    """Return available torrent sites"""
-    sites = [
-        {"id": "all", "name": "All Sites"},
-        {"id": "piratebay", "name": "The Pirate Bay"},
-        {"id": "limetorrents", "name": "LimeTorrents"},
-        {"id": "torlock", "name": "TorLock"},
-        {"id": "torrentscsv", "name": "Torrents CSV"},
-        {"id": "eztv", "name": "EZTV"},
-        {"id": "torrentproject", "name": "TorrentProject"},
-        {"id": "nyaa", "name": "Nyaa.si"},
-        {"id": "1337x", "name": "1337x"},
-        {"id": "magnetdl", "name": "MagnetDL"},
-        {"id": "glotorrents", "name": "GloTorrents"}
-    ]
-    return jsonify(sites)
+    """Return available torrent sites with their categories and capabilities"""
+    return listing_response('sites')
 
 @app.route('/api/categories')
 def get_categories():
-    """Return available categories"""
-    categories = [
-        {"id": "all", "name": "All Categories"},
-        {"id": "movies", "name": "Movies"},
-        {"id": "tv", "name": "TV Shows"},
-        {"id": "music", "name": "Music"},
-        {"id": "games", "name": "Games"},
-        {"id": "software", "name": "Software"},
-        {"id": "anime", "name": "Anime"},
-        {"id": "books", "name": "Books"}
-    ]
-    return jsonify(categories)
+    """Return available categories with the sites that support each"""
+    return listing_response('categories')
+
+@app.route('/api/stats')
+def get_stats():
+    """Return cache, search index, engine relevance, prefetcher and shared state counters"""
+    return jsonify({
+        "infohash_cache": infohash_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "search_index": search_index.stats(),
+        "torrentscsv_index": torrentscsv_index.stats(),
+        "engine_relevance": engine_relevance.stats(),
+        "prefetcher": prefetcher.stats(),
+        "shared_state": shared_state.stats()
+    })
+
+@app.route('/metrics')
+def get_metrics():
+    """Serve engine and cache metrics in the Prometheus text format"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/test')
 def test_connection():
-    """Test if the API is running and can access torrent sites"""
+    """Report the live health of every torrent site.
+
+    Built from the outcomes of real upstream requests, so checking it does
+    not probe the sites.
+    """
     results = {}
-    apis = {
-        'piratebay': PirateBayAPI(),
-        'limetorrents': LimeTorrentsAPI(),
-        'torlock': TorLockAPI(),
-        'torrentscsv': TorrentsCSVAPI(),
-        'eztv': EZTVAPI(),
-        'torrentproject': TorrentProjectAPI(),
-        'nyaa': NyaaAPI(),
-        '1337x': X1337API(),
-        'magnetdl': MagnetDLAPI(),
-        'glotorrents': GloTorrentsAPI()
-    }
     
-    for name, api in apis.items():
-        try:
-            test_data = api.retrieve_url(api.url)
-            results[name] = {
-                "status": "OK" if test_data else "No data",
-                "url": api.url
-            }
-        except Exception as e:
-            results[name] = {
-                "status": "Error",
-                "error": str(e),
-                "url": api.url
-            }
+    for name, api in engines.engines.items():
+        health = engine_health.snapshot(name)
+        if health["state"] == 'open':
+            status = "Down"
+        elif health["state"] == 'half_open':
+            status = "Probing"
+        else:
+            status = "OK" if health["requests"] else "Unknown"
+        results[name] = {"status": status, "url": api.url, **health}
     
     return jsonify({
         "status": "API is running",
@@ -955,5 +4054,64 @@ def test_connection():
         "tests": results
     })
 
+@app.cli.command('import-torrents-csv')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_torrents_csv(path):
+    """Import a Torrents-CSV dump (torrents.csv, optionally gzipped) for offline search.
+
+    Run again with a newer dump to update only the torrents that changed.
+    """
+    started = time.monotonic()
+    opener = gzip.open if path.endswith('.gz') else open
+    errors = torrentscsv_index.errors
+    with opener(path, 'rt', encoding='utf-8', errors='replace', newline='') as f:
+        try:
+            counts = engines.engines['torrentscsv'].import_dump(f)
+        except (ValueError, sqlite3.Error) as e:
+            raise click.ClickException(str(e))
+    click.echo(f"Read {counts['read']} rows in {time.monotonic() - started:.1f}s: {counts['imported']} imported, "
+               f"{counts['unchanged']} unchanged, {counts['skipped']} skipped")
+    if torrentscsv_index.errors > errors:
+        raise click.ClickException("some batches could not be written, see the log")
+
+def warm_up():
+    """Do the one-off setup up front, before a preloading server forks workers.
+
+    Builds the page template and the site listings once and creates the
+    SQLite schemas, so workers do not race to create them on their first
+    request.
+    """
+    app.jinja_env.get_template('index.html')
+    engines.listing('sites')
+    engines.listing('categories')
+    infohash_cache.connect()
+    search_index.connect()
+    if shared_state.enabled:
+        shared_state.connect()
+
+def after_fork():
+    """Drop state a forked worker must not share with its parent.
+
+    Threads do not survive a fork and SQLite connections must not cross one;
+    everything reset here is recreated on first use in the child.
+    """
+    engine_loop.loop = None
+    engine_loop.session = None
+    prefetcher.future = None
+    infohash_cache.conn = None
+    search_index.local = threading.local()
+    torrentscsv_index.local = threading.local()
+    shared_state.local = threading.local()
+
+def shutdown():
+    """Finish background work before the process exits"""
+    search_index.flush()
+    engine_loop.close()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=after_fork)
+atexit.register(shutdown)
+
 if __name__ == "__main__":
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Development server; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000)
@@ -0,0 +1,102 @@
+"""Benchmark JSON encoding, decoding and compression of search responses.
+
+The result lists are real site=all responses: every engine is searched once
+against the replay servers and the merged results are cycled up to each
+requested size. For each size it compares encoding the response as jsonify
+used to (stdlib json, sorted keys) with app.json_dumps, and times gzip and
+brotli on the encoded body at the levels the app uses. It then compares
+decoding the generated apibay and torrents-csv payloads with json.loads and
+app.json_loads. The fast backend is orjson when installed, else stdlib json.
+
+    python benchmarks/bench_json.py [--sizes 100,400,2000]
+"""
+import argparse
+import gzip
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the benchmark's caches and search index away from the app's real ones
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp())
+# Measure the app, not the per-host rate limit; set HOST_RATE to include it
+os.environ.setdefault('HOST_RATE', '0')
+
+import replay  # noqa: E402
+from bench_search import point_engines_at  # noqa: E402
+
+import app  # noqa: E402
+
+UPSTREAM_PAYLOADS = ('piratebay_search.json', 'torrentscsv_search.json')
+
+
+def site_all_results():
+    """Merged results of one site=all search against the replay servers"""
+    process, base_urls = replay.start()
+    try:
+        point_engines_at(base_urls)
+        results, _ = app.engine_loop.run(app.fan_out_search(app.engines.select(), 'ubuntu', 'all'))
+    finally:
+        process.terminate()
+    merger = app.ResultMerger()
+    merger.add(results)
+    return merger.results
+
+
+def stdlib_dumps(response):
+    return json.dumps(response, default=app.json_default, sort_keys=True, separators=(',', ':')).encode()
+
+
+def best_ms(func, repeat, number):
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,400,2000', help='comma separated result counts')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    results = site_all_results()
+    if not results:
+        sys.exit("the replayed search returned no results")
+    backend = 'orjson' if app.orjson is not None else 'json'
+    print(f"{len(results)} merged site=all results, fast backend: {backend}\n")
+
+    print(f"{'results':>8}{'KB':>8}{'stdlib ms':>11}{'fast ms':>9}{'speedup':>9}"
+          f"{'gzip KB':>9}{'gzip ms':>9}{'br KB':>7}{'br ms':>7}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        response = {'results': list(itertools.islice(itertools.cycle(results), size)), 'sites': {}}
+        body = app.json_dumps(response, sort_keys=True)
+        if json.loads(body) != json.loads(stdlib_dumps(response)):
+            sys.exit("json_dumps and the stdlib encoder disagree")
+        before = best_ms(lambda: stdlib_dumps(response), args.repeat, args.number)
+        after = best_ms(lambda: app.json_dumps(response, sort_keys=True), args.repeat, args.number)
+        gzipped = gzip.compress(body, compresslevel=app.GZIP_LEVEL)
+        gzip_ms = best_ms(lambda: gzip.compress(body, compresslevel=app.GZIP_LEVEL), args.repeat, args.number)
+        row = (f"{size:8}{len(body) / 1024:8.0f}{before:11.2f}{after:9.2f}{before / after:8.2f}x"
+               f"{len(gzipped) / 1024:9.0f}{gzip_ms:9.2f}")
+        if app.brotli is not None:
+            compressed = app.brotli.compress(body, quality=app.BROTLI_QUALITY)
+            br_ms = best_ms(lambda: app.brotli.compress(body, quality=app.BROTLI_QUALITY), args.repeat, args.number)
+            row += f"{len(compressed) / 1024:7.0f}{br_ms:7.2f}"
+        print(row)
+
+    print(f"\n{'payload':26}{'KB':>6}{'stdlib ms':>11}{'fast ms':>9}{'speedup':>9}")
+    for payload in UPSTREAM_PAYLOADS:
+        with open(os.path.join(replay.FIXTURES_DIR, payload), encoding='utf-8') as f:
+            text = f.read()
+        before = best_ms(lambda: json.loads(text), args.repeat, args.number)
+        after = best_ms(lambda: app.json_loads(text), args.repeat, args.number)
+        print(f"{payload:26}{len(text) / 1024:6.0f}{before:11.3f}{after:9.3f}{before / after:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark the engine row parsers on the saved HTML fixtures.
+
+"before" replays how the scrapers used to work: re.findall over the page with
+a lazy <tr>(.*?)</tr> row pattern, then one re.search per field against each
+extracted row string, with the patterns passed as strings. "after" is the engine's
+precompiled RowParser. Both must produce the same rows; the script fails loudly
+if they do not.
+
+    python benchmarks/bench_parsers.py [--repeat N]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+ENGINES = {
+    'limetorrents': app.LimeTorrentsAPI,
+    'torlock': app.TorLockAPI,
+    'eztv': app.EZTVAPI,
+    'torrentproject': app.TorrentProjectAPI,
+    'nyaa': app.NyaaAPI,
+    '1337x': app.X1337API,
+    'magnetdl': app.MagnetDLAPI,
+    'glotorrents': app.GloTorrentsAPI,
+}
+
+# Row patterns, and field patterns that have since been anchored, as the
+# scrapers used them before RowParser
+LEGACY_ROWS = {
+    'torlock': r'<tr[^>]*>(.*?)</tr>',
+    'eztv': r"<tr class='gac_bb'>(.*?)</tr>",
+    'torrentproject': r"<tr class='gac_bb'>(.*?)</tr>",
+    'nyaa': r'<tr class="default">(.*?)</tr>',
+    '1337x': r'<tr>(.*?)</tr>',
+    'magnetdl': r'<tr>(.*?)</tr>',
+    'glotorrents': r"<tr class='t-row'>(.*?)</tr>",
+}
+LEGACY_FIELDS = {
+    'eztv': {'age': r'(\d+h\s+\d+m)'},
+    'glotorrents': {'size': r'([0-9\.\,]+ (?:TB|GB|MB|KB))'},
+}
+
+
+def legacy_parse(engine_id, parser, page):
+    """Row-then-field parsing with per-call pattern lookups and row copies"""
+    rows = []
+    row_fields = [name for name in parser.row.groupindex]
+    overrides = LEGACY_FIELDS.get(engine_id, {})
+    for row in re.findall(LEGACY_ROWS.get(engine_id, parser.row.pattern), page, re.DOTALL):
+        if not parser.fields:
+            rows.append(dict(zip(row_fields, row if isinstance(row, tuple) else (row,))))
+            continue
+        if parser.require and parser.require not in row:
+            continue
+        fields = {}
+        for name, pattern in parser.fields:
+            match = re.search(overrides.get(name, pattern.pattern), row)
+            fields[name] = match.group(1) if match else None
+        rows.append(fields)
+    return rows
+
+
+def precompiled_parse(engine_id, parser, page):
+    return list(parser.parse(page))
+
+
+def bench(func, engine_id, parser, page, repeat, number):
+    return min(timeit.repeat(lambda: func(engine_id, parser, page), repeat=repeat, number=number)) / number
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('--repeat', type=int, default=5)
+    argparser.add_argument('--number', type=int, default=50)
+    args = argparser.parse_args()
+
+    print(f"{'engine':16}{'page KB':>9}{'rows':>6}{'before ms':>11}{'after ms':>10}{'speedup':>9}")
+    total_before = total_after = 0.0
+    for engine_id, engine in ENGINES.items():
+        with open(os.path.join(FIXTURES_DIR, f'{engine_id}_search.html'), encoding='utf-8') as f:
+            page = f.read()
+        parser = engine.parser
+        expected = legacy_parse(engine_id, parser, page)
+        if precompiled_parse(engine_id, parser, page) != expected:
+            sys.exit(f"{engine_id}: precompiled parser disagrees with the legacy parse")
+        before = bench(legacy_parse, engine_id, parser, page, args.repeat, args.number)
+        after = bench(precompiled_parse, engine_id, parser, page, args.repeat, args.number)
+        total_before += before
+        total_after += after
+        print(f"{engine_id:16}{len(page) / 1024:9.1f}{len(expected):6}"
+              f"{before * 1000:11.3f}{after * 1000:10.3f}{before / after:8.2f}x")
+    print(f"{'total':31}{total_before * 1000:11.3f}{total_after * 1000:10.3f}"
+          f"{total_before / total_after:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
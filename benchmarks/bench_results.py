@@ -0,0 +1,92 @@
+"""Benchmark the memory and serialization cost of search result records.
+
+"before" is a result set as the engines used to build it: one dict per result
+with its magnet link, trackers included, encoded up front. "after" is the same
+set as TorrentResult records, which keep only the info-hash and build the link
+when serialized. Both must serialize to the same JSON.
+
+    python benchmarks/bench_results.py [--results N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+import tracemalloc
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+URL = 'https://torrents-csv.com'
+SOURCE = 'Torrents CSV'
+
+
+def fields(i):
+    name = f'Ubuntu {i % 40}.04 Desktop amd64 build {i}'
+    return {
+        'name': name,
+        'size': f'{i % 9 + 1}.{i % 100:02d} GB',
+        'raw_size': (i % 9 + 1) * 1024**3,
+        'seeds': i * 7919 % 5000,
+        'leech': i * 104729 % 900,
+        'engine_url': URL,
+        'desc_link': f'{URL}/#/search/torrent/ubuntu/1',
+        'pub_date': int(time.time()) - i,
+        'category': 'unknown'.capitalize(),
+        'source': SOURCE,
+    }
+
+
+def info_hash(i):
+    return f'{i:040x}'
+
+
+def build_dicts(count):
+    results = []
+    for i in range(count):
+        result = fields(i)
+        trackers = '&'.join(urlencode({'tr': tracker}) for tracker in app.trackers_list)
+        result = dict({'link': f"magnet:?xt=urn:btih:{info_hash(i)}&{urlencode({'dn': result['name']})}&{trackers}"},
+                      **result, info_hash=info_hash(i), sources=[SOURCE])
+        results.append(result)
+    return results
+
+
+def build_records(count):
+    return [app.TorrentResult(**fields(i), info_hash=info_hash(i)) for i in range(count)]
+
+
+def retained_kb(build, count):
+    tracemalloc.start()
+    try:
+        results = build(count)
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del results
+    return size / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--results', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    dicts, records = build_dicts(args.results), build_records(args.results)
+    if json.dumps(dicts) != json.dumps(records, default=app.json_default):
+        sys.exit("records serialize differently from dicts")
+
+    print(f"{'':8}{'retained KB':>13}{'build ms':>10}{'dumps ms':>10}")
+    for label, build, results, default in (('before', build_dicts, dicts, None),
+                                           ('after', build_records, records, app.json_default)):
+        build_time = min(timeit.repeat(lambda: build(args.results), repeat=args.repeat, number=1))
+        dumps_time = min(timeit.repeat(lambda: json.dumps(results, default=default), repeat=args.repeat, number=1))
+        print(f"{label:8}{retained_kb(build, args.results):13.0f}{build_time * 1000:10.1f}{dumps_time * 1000:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Offline search benchmark: every engine, and the site=all path, against replayed upstreams.
+
+The engines are pointed at local replay servers (see replay.py) serving the
+generated fixtures (see make_fixtures.py), with optional injected latency and
+failures. For each engine, and for GET /api/search?site=all through the
+Flask app, it reports:
+
+  results   mean result count per search (0 means the parser no longer matches)
+  req/s     searches completed per second at the given concurrency
+  p50/p99   search latency in milliseconds
+  alloc KB  peak memory allocated during one search, from tracemalloc
+
+Detail pages are resolved cold on every search unless --warm is given. Use
+--json to save a run and --baseline to fail when a later run regresses.
+
+    python benchmarks/bench_search.py --latency-ms 50 --concurrency 8
+    python benchmarks/bench_search.py --json before.json
+    python benchmarks/bench_search.py --baseline before.json --tolerance 0.2
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the benchmark's caches and search index away from the app's real ones
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp())
+# Measure the app, not the per-host rate limit; set HOST_RATE to include it
+os.environ.setdefault('HOST_RATE', '0')
+
+import replay  # noqa: E402
+
+import app  # noqa: E402
+
+SITE_ALL = 'site=all'
+queries = itertools.count()
+
+
+def point_engines_at(base_urls):
+    """Send every engine's upstream requests to its replay server"""
+    for engine_id, api in app.engines.engines.items():
+        engine = type(api)
+        engine.url = base_urls[engine_id]
+        if hasattr(engine, 'api_url'):
+            engine.api_url = base_urls[engine_id]
+
+
+def search_engine(api):
+    return len(app.engine_loop.run(app.as_async(api).search(f'ubuntu{next(queries)}', 'all')))
+
+
+def search_site_all():
+    client = app.app.test_client()
+    # Unique queries so the result cache never answers
+    response = client.get('/api/search', query_string={'q': f'ubuntu{next(queries)}', 'site': 'all'})
+    return len(response.get_json()['results'])
+
+
+def clear_detail_cache():
+    with app.infohash_cache.lock:
+        conn = app.infohash_cache.connect()
+        conn.execute('DELETE FROM infohash')
+        conn.commit()
+
+
+def percentile(ordered, p):
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def measure(search, iterations, concurrency, warm):
+    def timed():
+        if not warm:
+            clear_detail_cache()
+        started = time.perf_counter()
+        count = search()
+        return time.perf_counter() - started, count
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        started = time.perf_counter()
+        runs = list(executor.map(lambda _: timed(), range(iterations)))
+        wall = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in runs)
+    return {
+        'results': sum(count for _, count in runs) / len(runs),
+        'throughput': len(runs) / wall,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def measure_allocations(search, iterations, warm):
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            if not warm:
+                clear_detail_cache()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            search()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks) / 1024
+
+
+def check_baseline(report, baseline, tolerance):
+    regressions = []
+    for target, stats in report.items():
+        before = baseline.get(target)
+        if not before:
+            continue
+        if stats['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{target}: p50 {before['p50_ms']:.1f} -> {stats['p50_ms']:.1f} ms")
+        if stats['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append(f"{target}: throughput {before['throughput']:.1f} -> {stats['throughput']:.1f} req/s")
+        if stats['alloc_kb'] > before['alloc_kb'] * (1 + tolerance):
+            regressions.append(f"{target}: alloc {before['alloc_kb']:.0f} -> {stats['alloc_kb']:.0f} KB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--engines', help='comma separated engine ids (default: all)')
+    parser.add_argument('--no-site-all', action='store_true', help='skip the site=all path')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--alloc-iterations', type=int, default=3)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--failure-mode', choices=replay.FAILURE_MODES, default='status')
+    parser.add_argument('--warm', action='store_true', help='keep resolved detail pages cached between searches')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--baseline', help='compare against a report written with --json')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    process, base_urls = replay.start(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                                      failure_rate=args.failure_rate, failure_mode=args.failure_mode)
+    try:
+        point_engines_at(base_urls)
+        apis = app.engines.engines
+        targets = {engine_id: (lambda api=api: search_engine(api)) for engine_id, api in apis.items()
+                   if not args.engines or engine_id in args.engines.split(',')}
+        if not args.no_site_all:
+            targets[SITE_ALL] = search_site_all
+
+        report = {}
+        print(f"{'target':16}{'results':>9}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'alloc KB':>10}")
+        for target, search in targets.items():
+            stats = measure(search, args.iterations, args.concurrency, args.warm)
+            stats['alloc_kb'] = measure_allocations(search, args.alloc_iterations, args.warm)
+            report[target] = stats
+            print(f"{target:16}{stats['results']:9.1f}{stats['throughput']:9.1f}{stats['p50_ms']:9.1f}"
+                  f"{stats['p99_ms']:9.1f}{stats['alloc_kb']:10.0f}")
+    finally:
+        process.terminate()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if not args.failure_rate:
+        failures += [f"{target}: no results parsed" for target, stats in report.items() if not stats['results']]
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += check_baseline(report, json.load(f), args.tolerance)
+    if failures:
+        sys.exit('\n'.join(['Regressions:'] + failures))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark importing a Torrents-CSV dump and searching it offline.
+
+Writes a synthetic dump in the published format (';' separated, one row per
+torrent), imports it into a fresh dump index and reports rows/s and peak
+RSS. It then re-imports the same dump, where every row should be unchanged,
+and a copy with a fraction of rows re-scraped, where only those should be
+written. Last it times the Torrents CSV engine answering queries from the
+index in local mode: title searches made of words from a random torrent's
+name, and single tags shared by a large share of the dump, the worst case
+for ranking.
+
+    python benchmarks/bench_torrents_csv.py [--rows 300000] [--changed 0.1]
+"""
+import argparse
+import itertools
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATA_DIR = tempfile.mkdtemp()
+os.environ.setdefault('DATA_DIR', DATA_DIR)
+os.environ['TORRENTS_CSV_INDEX_PATH'] = os.path.join(DATA_DIR, 'torrentscsv.db')
+os.environ['TORRENTS_CSV_MODE'] = 'local'
+
+import app  # noqa: E402
+
+HEADER = 'infohash;name;size_bytes;created_unix;seeders;leechers;completed;scraped_date\n'
+# Release tags, each on a large share of names
+TAGS = ('1080p 720p 2160p hdr x264 x265 web bluray remux flac mp3 iso amd64 complete repack proper '
+        'multi subs dual audio').split()
+SYLLABLES = 'ka lo mi ne ru sa ti vo be da fi gu ho je ki la mo nu pi re so tu va we xi yo za'.split()
+# Title words, used with Zipf frequencies like words in real titles
+TITLE_WORDS = sorted({''.join(random.Random(i).choices(SYLLABLES, k=random.Random(-i).randint(2, 4)))
+                      for i in range(30000)})
+TITLE_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(TITLE_WORDS) + 1)))
+NOW = int(time.time())
+
+
+def dump_name(rng, i):
+    title = rng.choices(TITLE_WORDS, cum_weights=TITLE_WEIGHTS, k=rng.randint(2, 5))
+    return ' '.join(title + rng.sample(TAGS, rng.randint(1, 3)) + [str(1950 + i % 75)])
+
+
+def write_dump(path, rows, changed=0.0, seed=1):
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(HEADER)
+        for i in range(rows):
+            scraped = NOW - 86400 + (3600 if rng.random() < changed else 0)
+            f.write(f'{i:040x};{dump_name(rng, i)};{rng.randint(10**6, 10**10)};{NOW - rng.randint(0, 10**8)};'
+                    f'{rng.randint(0, 5000)};{rng.randint(0, 500)};{rng.randint(0, 10**5)};{scraped}\n')
+
+
+def import_file(path):
+    started = time.perf_counter()
+    with open(path, encoding='utf-8', newline='') as f:
+        counts = app.engines.engines['torrentscsv'].import_dump(f)
+    return counts, time.perf_counter() - started
+
+
+def percentile(ordered, p):
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=300000)
+    parser.add_argument('--changed', type=float, default=0.1, help='fraction of rows re-scraped in the second dump')
+    parser.add_argument('--queries', type=int, default=300)
+    args = parser.parse_args()
+
+    first, second = os.path.join(DATA_DIR, 'torrents.csv'), os.path.join(DATA_DIR, 'torrents-later.csv')
+    write_dump(first, args.rows)
+    write_dump(second, args.rows, changed=args.changed)
+    print(f"dump: {args.rows} rows, {os.path.getsize(first) / 2**20:.0f} MB")
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{'import':12}{'read':>10}{'imported':>10}{'unchanged':>11}{'seconds':>9}{'rows/s':>10}")
+    for label, path in (('fresh', first), ('same dump', first), ('re-scraped', second)):
+        counts, seconds = import_file(path)
+        print(f"{label:12}{counts['read']:10}{counts['imported']:10}{counts['unchanged']:11}{seconds:9.1f}"
+              f"{counts['read'] / seconds:10.0f}")
+    # ru_maxrss is in KB on Linux
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"peak RSS {rss_after / 1024:.0f} MB, grew {(rss_after - rss_before) / 1024:.0f} MB while importing; "
+          f"index {os.path.getsize(app.TORRENTS_CSV_INDEX_PATH) / 2**20:.0f} MB")
+
+    # Titles as users search them: the first words of a torrent's name
+    rng = random.Random(1)
+    names = [dump_name(rng, i) for i in range(args.rows)]
+    rng = random.Random(2)
+    titles = [' '.join(rng.choice(names).split()[:rng.randint(1, 2)]) for _ in range(args.queries)]
+    api = app.engines.engines['torrentscsv']
+    print(f"\n{'queries':22}{'p50 ms':>8}{'p99 ms':>8}{'results':>9}")
+    for label, queries, search in (('titles', titles, api.search_dump),
+                                   ('titles, engine search', titles, lambda q: app.engine_loop.run(api.search(q))),
+                                   ('single tags', TAGS, api.search_dump)):
+        latencies, results = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            results += len(search(query))
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        print(f"{label:22}{percentile(latencies, 50) * 1000:8.2f}{percentile(latencies, 99) * 1000:8.2f}"
+              f"{results / len(queries):9.0f}")
+    app.engine_loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Load test the production server: how requests/second scale with worker count.
+
+For each worker count it starts gunicorn with gunicorn.conf.py, serving the
+app with its engines pointed at the replay servers (see replay.py), and
+drives GET /api/search?site=all from keep-alive client threads for a fixed
+duration. Queries are drawn from a Zipf-like distribution over --queries
+distinct terms, so popular ones are answered from cache, by any worker once
+shared state is on, and the tail reaches the replayed upstreams. Reports
+throughput, latency and errors per worker count.
+
+    python benchmarks/load_test.py --workers 1,2,4 --clients 16 --duration 20
+"""
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+import replay  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers, threads, port, base_urls, shared_state):
+    env = dict(os.environ, WEB_WORKERS=str(workers), WEB_THREADS=str(threads), BIND=f'127.0.0.1:{port}',
+               REPLAY_URLS=json.dumps(base_urls), DATA_DIR=tempfile.mkdtemp(),
+               SHARED_STATE='1' if shared_state else '0', HOST_RATE=os.environ.get('HOST_RATE', '0'),
+               PREFETCH_BUDGET='0', LOG_LEVEL='WARNING', PYTHONPATH=os.pathsep.join([BENCH_DIR, ROOT]))
+    server = subprocess.Popen(['gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                               '--access-logfile', '/dev/null', '--log-level', 'warning', 'replay_app:app'],
+                              cwd=BENCH_DIR, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/api/stats')
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit(f"gunicorn did not start on port {port}")
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def zipf_weights(count, s=1.1):
+    return [1 / (rank ** s) for rank in range(1, count + 1)]
+
+
+def client(port, stop, terms, weights, seed, results):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies, errors = [], 0
+    while not stop.is_set():
+        term = rng.choices(terms, weights)[0]
+        started = time.perf_counter()
+        try:
+            conn.request('GET', '/api/search?' + urlencode({'q': term, 'site': 'all'}))
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+    results.append((latencies, errors))
+
+
+def percentile(ordered, p):
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] if ordered else float('nan')
+
+
+def run(port, clients, duration, terms, weights):
+    stop = threading.Event()
+    results = []
+    threads = [threading.Thread(target=client, args=(port, stop, terms, weights, i, results)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    latencies = sorted(itertools.chain.from_iterable(latency for latency, _ in results))
+    return {
+        'requests': len(latencies),
+        'throughput': len(latencies) / wall,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'errors': sum(errors for _, errors in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4', help='comma separated worker counts')
+    parser.add_argument('--threads', type=int, default=8, help='threads per worker')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20, help='seconds per worker count')
+    parser.add_argument('--warmup', type=float, default=3, help='unmeasured seconds before each run')
+    parser.add_argument('--queries', type=int, default=500, help='distinct query terms')
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--no-shared-state', action='store_true', help='keep each worker\'s caches private')
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+
+    terms = [f'ubuntu {i}' for i in range(args.queries)]
+    weights = zipf_weights(args.queries)
+    process, base_urls = replay.start(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000)
+    report = {}
+    try:
+        print(f"{'workers':>8}{'requests':>10}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        for workers in (int(count) for count in args.workers.split(',')):
+            port = free_port()
+            server = start_server(workers, args.threads, port, base_urls, not args.no_shared_state)
+            try:
+                if args.warmup:
+                    run(port, args.clients, args.warmup, terms, weights)
+                stats = report[workers] = run(port, args.clients, args.duration, terms, weights)
+            finally:
+                stop_server(server)
+            print(f"{workers:8}{stats['requests']:10}{stats['throughput']:9.1f}{stats['p50_ms']:9.1f}"
+                  f"{stats['p99_ms']:9.1f}{stats['errors']:8}")
+    finally:
+        process.terminate()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""Generate the offline fixtures used by the benchmarks.
+
+The fixtures reproduce the markup each engine in app.py parses (search pages,
+detail pages and the apibay / torrents-csv JSON payloads) wrapped in the kind
+of boilerplate the real sites send, so page sizes and row counts are close to
+what the scrapers see live. Output is deterministic; re-run this script after
+changing an engine's patterns and commit the result.
+
+    python benchmarks/make_fixtures.py
+"""
+import json
+import os
+import random
+from urllib.parse import urlencode
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+WORDS = ['ubuntu', 'linux', 'desktop', 'server', 'amd64', 'iso', 'debian', 'fedora', 'workstation',
+         'live', 'big', 'buck', 'bunny', 'sintel', 'tears', 'of', 'steel', 'elephants', 'dream',
+         '1080p', '720p', '2160p', 'x264', 'x265', 'hevc', 'aac', 'flac', 'web', 'dl', 'bluray',
+         'complete', 'season', 'collection', 'remastered', 'extended', 'edition', 'soundtrack']
+SIZES = ['KB', 'MB', 'GB']
+
+
+def rng_for(name):
+    return random.Random(name)
+
+
+def torrent_name(rng):
+    return ' '.join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(3, 7)))
+
+
+def info_hash(rng):
+    return ''.join(rng.choice('0123456789ABCDEF') for _ in range(40))
+
+
+def size_text(rng):
+    return f"{rng.uniform(1, 999):.2f} {rng.choice(SIZES)}"
+
+
+def magnet(rng, name):
+    return f"magnet:?xt=urn:btih:{info_hash(rng)}&{urlencode({'dn': name})}&tr=udp%3A%2F%2Ftracker.opentrackr.org%3A1337"
+
+
+def page(title, body, rng):
+    """Wrap body in boilerplate of roughly the size real result pages carry"""
+    css = '\n'.join(f'.c{i} {{ margin: {i}px; padding: {i % 7}px; color: #{i:06x}; }}' for i in range(600))
+    script = '\n'.join(f'window.cfg{i} = {{"id": {i}, "slot": "{rng.random():.8f}"}};' for i in range(300))
+    nav = ''.join(f'<li><a href="/cat/{i}/">{rng.choice(WORDS)}</a></li>' for i in range(120))
+    return (f'<!DOCTYPE html><html><head><title>{title}</title><style>{css}</style>'
+            f'<script>{script}</script></head><body><ul class="nav">{nav}</ul>'
+            f'<div class="content">{body}</div><footer>{"<p>footer</p>" * 40}</footer></body></html>')
+
+
+def slug(name):
+    return name.replace(' ', '-')
+
+
+def torlock(rng, rows=25):
+    body = '<table><tr><th>Name</th><th>Added</th><th>Size</th><th>Seeds</th><th>Peers</th></tr>'
+    for i in range(rows):
+        name = torrent_name(rng)
+        body += (f'<tr><td><div><a href="/torrent/{100000 + i}/{slug(name)}.html"><b>{name}</b></a></div></td>'
+                 f'<td class="td">1/{i + 1}/2024</td><td>{size_text(rng)}</td>'
+                 f'<td class="tul"><span class="seeds">{rng.randint(0, 5000)}</span></td>'
+                 f'<td class="tdl"><span class="leeches">{rng.randint(0, 900)}</span></td></tr>')
+    return page('TorLock', body + '</table>', rng)
+
+
+def eztv(rng, rows=25):
+    body = "<table><tr><td class='section_post_header'>Show</td></tr>"
+    for i in range(rows):
+        name = torrent_name(rng)
+        size = size_text(rng)
+        body += (f"<tr class='gac_bb'><td class=\"forum_thread_post\"><a href=\"/ep/{i}/{slug(name)}/\" "
+                 f"class=\"epinfo\" title=\"{name} ({size})\">{name}</a></td>"
+                 f"<td class=\"forum_thread_post\"><a class=\"magnet\" href=\"{magnet(rng, name)}\" "
+                 f"title=\"Magnet Link\"></a></td><td class=\"forum_thread_post\">{size}</td>"
+                 f"<td class=\"forum_thread_post\">{rng.randint(1, 23)}h {rng.randint(1, 59)}m</td>"
+                 f"<td class=\"forum_thread_post_end\">{rng.randint(0, 3000)}</td></tr>")
+    return page('EZTV', body + '</table>', rng)
+
+
+def torrentproject(rng, rows=25):
+    body = '<table>'
+    for i in range(rows):
+        name = torrent_name(rng)
+        body += (f"<tr class='gac_bb'><td><a href=\"/{info_hash(rng).lower()}/{slug(name)}-torrent.html\" "
+                 f"title=\"{name}\">{name}</a></td><td>{size_text(rng)}</td>"
+                 f"<td><span style=\"color: green;\">{rng.randint(0, 4000)}</span></td>"
+                 f"<td><span style=\"color: red;\">{rng.randint(0, 800)}</span></td><td>2024-01-{i % 28 + 1:02d}</td></tr>")
+    return page('TorrentProject', body + '</table>', rng)
+
+
+def nyaa(rng, rows=75):
+    body = '<table class="torrent-list"><thead><tr><th>Category</th><th>Name</th></tr></thead><tbody>'
+    for i in range(rows):
+        name = torrent_name(rng)
+        body += (f'<tr class="default"><td><a href="/?c=1_2" title="Anime - English-translated">'
+                 f'<img src="/static/img/icons/nyaa/1_2.png" alt="Anime"></a></td>'
+                 f'<td colspan="2"><a href="/view/{1500000 + i}" title="{name}">'
+                 f'<i class="fa fa-fw fa-file"></i> {name}</a></td>'
+                 f'<td class="text-center"><a href="/download/{1500000 + i}.torrent"><i class="fa fa-fw fa-download"></i></a>'
+                 f'<a href="{magnet(rng, name)}"><i class="fa fa-fw fa-magnet"></i></a></td>'
+                 f'<td class="text-center">{size_text(rng)}</td>'
+                 f'<td class="text-center">2024-01-{i % 28 + 1:02d} 12:{i % 60:02d}</td>'
+                 f'<td class="text-center" style="color: green;">{rng.randint(0, 2000)}</td>'
+                 f'<td class="text-center" style="color: red;">{rng.randint(0, 300)}</td>'
+                 f'<td class="text-center">{rng.randint(0, 9000)}</td></tr>')
+    return page('Nyaa', body + '</tbody></table>', rng)
+
+
+def x1337(rng, rows=25):
+    body = '<table class="table-list"><thead><tr><th class="coll-1 name">name</th><th>se</th></tr></thead><tbody>'
+    for i in range(rows):
+        name = torrent_name(rng)
+        body += (f'<tr><td class="coll-1 name"><a href="/sub/54/0/" class="icon"><i class="flaticon-hd"></i></a>'
+                 f'<a href="/torrent/{5000000 + i}/{slug(name)}/">{name}</a></td>'
+                 f'<td class="seeds">{rng.randint(0, 6000)}</td><td class="leeches">{rng.randint(0, 900)}</td>'
+                 f'<td class="coll-date">Jan. {i % 28 + 1}th \'24</td><td class="size">{size_text(rng)}</td>'
+                 f'<td class="coll-5 uploader"><a href="/user/someone/">someone</a></td></tr>')
+    return page('1337x', body + '</tbody></table>', rng)
+
+
+def magnetdl(rng, rows=25):
+    body = '<table class="download"><thead><tr><th>Name</th><th>Size</th></tr></thead><tbody>'
+    for i in range(rows):
+        name = torrent_name(rng)
+        body += (f'<tr><td class="m"><a href="{magnet(rng, name)}" title="Direct Download"><img src="/img/m.gif"></a></td>'
+                 f'<td class="n"><a href="/file/{i}/{slug(name).lower()}/">{name}</a></td>'
+                 f'<td>{rng.randint(1, 30)} days</td><td class="t5">Movie</td><td>1</td>'
+                 f'<td>{size_text(rng)}</td><td class="s">{rng.randint(0, 3000)}</td>'
+                 f'<td class="l">{rng.randint(0, 500)}</td></tr>')
+    return page('MagnetDL', body + '</tbody></table>', rng)
+
+
+def glotorrents(rng, rows=25):
+    body = "<table class='ttable_headinner'><tr class='t-head'><td>Type</td><td>Name</td></tr>"
+    for i in range(rows):
+        name = torrent_name(rng)
+        body += (f"<tr class='t-row'><td class='ttable_col1' align='center'><a href='/movies/'><img src='/images/cat.png'></a></td>"
+                 f"<td class='ttable_col2' nowrap='nowrap'><a title=\"{name}\" href=\"/{slug(name).lower()}-f{900000 + i}.html\">"
+                 f"<b>{name}</b></a></td><td class='ttable_col1' align='center'>"
+                 f"<a rel='nofollow' href='/download.php?id={900000 + i}'><img src='/images/dl.png'></a></td>"
+                 f"<td class='ttable_col2' align='center'><a rel='nofollow' href=\"{magnet(rng, name)}\"><img src='/images/magnet.png'></a></td>"
+                 f"<td class='ttable_col1' align='center'>{size_text(rng)}</td>"
+                 f"<td class='ttable_col2' align='center'><font color='green'><b>{rng.randint(0, 4000)}</b></font></td>"
+                 f"<td class='ttable_col1' align='center'><font color='#ff0000'><b>{rng.randint(0, 700)}</b></font></td></tr>")
+    return page('GloTorrents', body + '</table>', rng)
+
+
+def limetorrents(rng, rows=25):
+    body = '<table class="table2"><tr><th>Torrent Name</th><th>Added</th><th>Size</th><th>Seed</th><th>Leech</th></tr>'
+    for i in range(rows):
+        name = torrent_name(rng)
+        body += (f'<tr><td class="tdleft"><div class="tt-name"><a href="/{slug(name)}-torrent-{20000000 + i}.html">{name}</a></div></td>'
+                 f'<td class="tdnormal">{i + 1} days ago</td><td class="tdnormal"><div class="tt-size"><span>{size_text(rng)}</span></div></td>'
+                 f'<td class="tdseed"><div class="ttseed">{rng.randint(0, 5000)}</div></td>'
+                 f'<td class="tdleech"><div class="ttleech">{rng.randint(0, 900)}</div></td></tr>')
+    return page('LimeTorrents', body + '</table>', rng)
+
+
+def detail_with_magnet(rng, title):
+    name = torrent_name(rng)
+    files = ''.join(f'<li>{torrent_name(rng)}.mkv <span>({size_text(rng)})</span></li>' for _ in range(40))
+    body = (f'<h1>{name}</h1><div class="torrent-detail"><ul class="download-links">'
+            f'<li><a class="torrentdown1" href="{magnet(rng, name)}">Magnet Download</a></li></ul>'
+            f'<div class="file-content"><ul>{files}</ul></div></div>')
+    return page(title, body, rng)
+
+
+def limetorrents_detail(rng):
+    files = ''.join(f'<li>{torrent_name(rng)}.mkv</li>' for _ in range(40))
+    body = (f'<h1>{torrent_name(rng)}</h1><div class="torrentinfo"><table>'
+            f'<tr><td><b>Hash</b> :</td><td>{info_hash(rng)}</td></tr></table></div><ul>{files}</ul>')
+    return page('LimeTorrents', body, rng)
+
+
+def piratebay(rng, rows=100):
+    results = []
+    for i in range(rows):
+        results.append({
+            'id': str(70000000 + i), 'name': torrent_name(rng), 'info_hash': info_hash(rng),
+            'leechers': str(rng.randint(0, 900)), 'seeders': str(rng.randint(0, 9000)),
+            'num_files': str(rng.randint(1, 40)), 'size': str(rng.randint(10**6, 10**11)),
+            'username': 'uploader', 'added': str(1700000000 + i * 3600), 'status': 'vip',
+            'category': rng.choice(['101', '201', '207', '301', '401']), 'imdb': ''
+        })
+    return json.dumps(results)
+
+
+def torrentscsv(rng, rows=100):
+    torrents = []
+    for i in range(rows):
+        torrents.append({
+            'rowid': i, 'infohash': info_hash(rng).lower(), 'name': torrent_name(rng),
+            'size_bytes': rng.randint(10**6, 10**11), 'created_unix': 1600000000 + i * 86400,
+            'seeders': rng.randint(0, 5000), 'leechers': rng.randint(0, 800),
+            'completed': rng.randint(0, 90000), 'scraped_date': 1700000000
+        })
+    return json.dumps({'torrents': torrents, 'next': rows})
+
+
+FIXTURES = {
+    'torlock_search.html': torlock,
+    'eztv_search.html': eztv,
+    'torrentproject_search.html': torrentproject,
+    'nyaa_search.html': nyaa,
+    '1337x_search.html': x1337,
+    'magnetdl_search.html': magnetdl,
+    'glotorrents_search.html': glotorrents,
+    'limetorrents_search.html': limetorrents,
+    '1337x_detail.html': lambda rng: detail_with_magnet(rng, '1337x'),
+    'torrentproject_detail.html': lambda rng: detail_with_magnet(rng, 'TorrentProject'),
+    'limetorrents_detail.html': limetorrents_detail,
+    'piratebay_search.json': piratebay,
+    'torrentscsv_search.json': torrentscsv,
+}
+
+
+def main():
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for filename, build in FIXTURES.items():
+        content = build(rng_for(filename))
+        with open(os.path.join(FIXTURES_DIR, filename), 'w', encoding='utf-8') as f:
+            f.write(content)
+        print(f"{filename:32} {len(content) / 1024:8.1f} KB")
+
+
+if __name__ == '__main__':
+    main()
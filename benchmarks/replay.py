@@ -0,0 +1,117 @@
+"""Local stand-in for the upstream torrent sites.
+
+Each engine gets its own HTTP server on 127.0.0.1, so per-host connection
+pools and limits behave as they do against the real sites. Servers answer
+every request with the generated fixture for that engine and path (see
+make_fixtures.py), after an injected latency, and can be told to fail a
+fraction of requests. They run in a child process so serving them does not
+show up in the app's timings or allocations. The fixtures mimic the sites'
+markup; parsing them proves nothing about the live sites.
+"""
+import multiprocessing
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# engine id -> [(path substring, fixture)], first match wins, '' matches all
+ROUTES = {
+    'piratebay': [('', 'piratebay_search.json')],
+    'limetorrents': [('/search/', 'limetorrents_search.html'), ('', 'limetorrents_detail.html')],
+    'torlock': [('', 'torlock_search.html')],
+    'torrentscsv': [('', 'torrentscsv_search.json')],
+    'eztv': [('', 'eztv_search.html')],
+    'torrentproject': [('/browse', 'torrentproject_search.html'), ('', 'torrentproject_detail.html')],
+    'nyaa': [('', 'nyaa_search.html')],
+    '1337x': [('/torrent/', '1337x_detail.html'), ('', '1337x_search.html')],
+    'magnetdl': [('', 'magnetdl_search.html')],
+    'glotorrents': [('', 'glotorrents_search.html')],
+}
+
+FAILURE_MODES = ('status', 'reset', 'stall')
+STALL_SECONDS = 30
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, engine_id, latency=0.0, jitter=0.0, failure_rate=0.0, failure_mode='status'):
+        super().__init__(('127.0.0.1', 0), ReplayHandler)
+        self.routes = []
+        for substring, fixture in ROUTES[engine_id]:
+            with open(os.path.join(FIXTURES_DIR, fixture), 'rb') as f:
+                content_type = 'application/json' if fixture.endswith('.json') else 'text/html; charset=utf-8'
+                self.routes.append((substring, f.read(), content_type))
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.random = random.Random(engine_id)
+
+    def lookup(self, path):
+        for substring, body, content_type in self.routes:
+            if substring in path:
+                return body, content_type
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, delayed ACKs
+    # add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.replay()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.replay()
+
+    def replay(self):
+        server = self.server
+        time.sleep(server.latency + server.random.uniform(0, server.jitter))
+        if server.random.random() < server.failure_rate:
+            if server.failure_mode == 'reset':
+                self.close_connection = True
+                return
+            if server.failure_mode == 'stall':
+                time.sleep(STALL_SECONDS)
+            self.send_error(503)
+            return
+        body, content_type = server.lookup(self.path)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(engine_ids, conn, **options):
+    servers = {engine_id: ReplayServer(engine_id, **options) for engine_id in engine_ids}
+    conn.send({engine_id: server.server_address[1] for engine_id, server in servers.items()})
+    for server in servers.values():
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Serve until the parent terminates us
+    threading.Event().wait()
+
+
+def start(engine_ids=tuple(ROUTES), latency=0.0, jitter=0.0, failure_rate=0.0, failure_mode='status'):
+    """Start the replay servers in a child process.
+
+    Returns (process, {engine_id: base_url}); terminate the process when done.
+    latency and jitter are in seconds.
+    """
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve, args=(engine_ids, child_conn), kwargs={
+        'latency': latency, 'jitter': jitter, 'failure_rate': failure_rate, 'failure_mode': failure_mode
+    }, daemon=True)
+    process.start()
+    ports = parent_conn.recv()
+    return process, {engine_id: f'http://127.0.0.1:{port}' for engine_id, port in ports.items()}
@@ -0,0 +1,17 @@
+"""The app with its engines pointed at replay servers, for load_test.py.
+
+    REPLAY_URLS='{"piratebay": "http://127.0.0.1:..."}' gunicorn -c gunicorn.conf.py replay_app:app
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search import point_engines_at  # noqa: E402
+
+from app import app  # noqa: E402
+
+__all__ = ['app']
+
+point_engines_at(json.loads(os.environ['REPLAY_URLS']))
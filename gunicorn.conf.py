@@ -0,0 +1,43 @@
+"""Production server settings: gunicorn -c gunicorn.conf.py app:app
+
+Every setting can be overridden from the environment:
+
+  BIND          address to listen on (default 0.0.0.0:5000)
+  WEB_WORKERS   worker processes (default: one per CPU)
+  WEB_THREADS   request threads per worker (default 8); raise FANOUT_WORKERS
+                with it, by 8 per thread, or site=all searches queue for
+                engine threads (see README)
+
+Workers are forked from a master that has already imported the app and built
+the engines. They share cached responses and open circuits through SQLite
+(SHARED_STATE=1, on by default here), and split the per-host request rate so
+the upstream sites see the configured rate however many workers there are.
+"""
+import os
+
+workers = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+threads = int(os.environ.get('WEB_THREADS', 8))
+
+os.environ.setdefault('SHARED_STATE', '1')
+# HOST_RATE and HOST_BURST are per process; divide the defaults between workers
+os.environ.setdefault('HOST_RATE', str(10 / workers))
+os.environ.setdefault('HOST_BURST', str(max(1, 20 // workers)))
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+preload_app = True
+# A site=all search can wait on slow engines for most of this
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+
+def when_ready(server):
+    import app
+    app.warm_up()
+
+
+def worker_exit(server, worker):
+    import app
+    app.shutdown()